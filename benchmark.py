@@ -0,0 +1,215 @@
+# Script to benchmark each log script's pipeline on generated logs and record the results as JSON
+#
+# 1. Generates deterministic logs with genlogs.py (reused while the settings match)
+# 2. Runs each pipeline in a fresh Python process, measuring wall time, lines/sec and peak memory (RSS)
+#    of the main process and of the largest worker process (runs with --workers above 1)
+# 3. Saves the results to a JSON file, and compares them with an earlier results file if given
+#
+# Usage:
+#   python benchmark.py                                   # Run every pipeline with the settings below
+#   python benchmark.py --only sitesearch tier2           # Run some pipelines
+#   python benchmark.py --compare bench_results_old.json  # Flag regressions against an earlier run
+
+# Libraries
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import genlogs
+import logengine
+from logengine import CsvExportReport, ExitPagesReport, FolderSummaryReport, PageCtrReport, SearchTermsReport, run_reports
+
+# Configuration
+data_folder = "bench-data/"  # Folder for the generated logs
+lines_per_file = 100000  # Lines in access.log and in each rotated file
+archive_count = 4  # Rotated files: access.log.1 (plain) and access.log.2.gz onwards
+seed = 42  # Seed for the log generator
+repeat = 3  # Runs per pipeline; the fastest wall time is kept
+results_path = "bench_results.json"  # Path to the JSON results file
+regression_threshold = 0.10  # Flag pipelines that got more than 10% slower or bigger
+bot_list = ['bot','googlebot', 'bingbot', 'yandex', 'baiduspider', 'ahrefsbot', 'semrushbot', 'dataforseo','gptbot','pinterestbot','Cloudflare-Healthchecks','makemerrybot','applebot','statuscake','pingdom']
+url_exceptions = ['contact', 'review', 'jsonapi', 'widget', 'blog', 'agreement','admincp','promokit']
+
+# Pipelines: name -> (input, function(log_path, output_folder, workers))
+# Input is 'plain' (access.log, like the single-file scripts), 'archives' (the .gz files, like the
+# folder scripts) or 'all' (every file in time order, like getpagectr.py)
+pipelines = {
+    'getcsv': ('plain', lambda log_path, out, workers: run_reports(
+        log_path, [CsvExportReport(os.path.join(out, 'analysis.csv'))], workers=workers)),
+    'tier1': ('plain', lambda log_path, out, workers: run_reports(
+        log_path, [FolderSummaryReport(1, os.path.join(out, 'tier1.csv'), bot_list, url_exceptions)], workers=workers)),
+    'tier2': ('archives', lambda log_path, out, workers: run_reports(
+        log_path, [FolderSummaryReport(2, os.path.join(out, 'tier2.csv'), bot_list, url_exceptions)], workers=workers)),
+    'tier3': ('archives', lambda log_path, out, workers: run_reports(
+        log_path, [FolderSummaryReport(3, os.path.join(out, 'tier3.csv'), bot_list, url_exceptions)], workers=workers)),
+    'sitesearch': ('plain', lambda log_path, out, workers: run_reports(
+        log_path, [SearchTermsReport(os.path.join(out, 'search.csv'), '/search', 'q')], workers=workers)),
+    'sitesearchmulti': ('archives', lambda log_path, out, workers: run_reports(
+        log_path, [SearchTermsReport(os.path.join(out, 'search.csv'), '/search', 'q')], workers=workers)),
+    'exitpages': ('plain', lambda log_path, out, workers: run_reports(
+        log_path, [ExitPagesReport(os.path.join(out, 'exitpages.csv'), '/')])),
+    'pagectr': ('all', lambda log_path, out, workers: run_reports(
+        log_path, [PageCtrReport(os.path.join(out, 'pagectr.csv'), '/')], chronological=True)),
+}
+
+# Function to generate the benchmark logs unless the folder already has logs from the same settings
+def prepare_logs():
+    summary_path = os.path.join(data_folder, 'generated.json')
+    expected = {'lines_per_file': lines_per_file, 'archive_count': archive_count, 'seed': seed}
+    try:
+        with open(summary_path) as summary_file:
+            summary = json.load(summary_file)
+        if all(summary.get(key) == value for key, value in expected.items()):
+            return summary
+    except (OSError, ValueError):
+        pass
+    return genlogs.generate_logs(data_folder, lines_per_file, archive_count, seed)
+
+# Function to get the path a pipeline reads and how many lines that is
+def pipeline_input(input_kind, summary):
+    if input_kind == 'plain':
+        return os.path.join(data_folder, 'access.log'), summary['lines_per_file']
+    archives = [name for name in summary['files'] if name.endswith('.gz')]
+    if input_kind == 'archives':
+        return data_folder, len(archives) * summary['lines_per_file']
+    return data_folder, len(summary['files']) * summary['lines_per_file']
+
+# Function to run one pipeline in this process and print its measurements as JSON (used by the child process)
+def run_pipeline_here(name, log_path, workers, use_cache):
+    import resource  # Not available on Windows
+
+    logengine.use_log_cache = use_cache
+    input_kind, pipeline = pipelines[name]
+    with tempfile.TemporaryDirectory() as output_folder, contextlib.redirect_stdout(open(os.devnull, 'w')):
+        started = time.perf_counter()
+        pipeline(log_path, output_folder, workers)
+        wall_seconds = time.perf_counter() - started
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS. For RUSAGE_CHILDREN it's the largest single worker
+    # process (they've all exited by now), not their sum
+    def peak_rss_mb(who):
+        peak_rss = resource.getrusage(who).ru_maxrss
+        return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+    main_rss_mb = peak_rss_mb(resource.RUSAGE_SELF)
+    worker_rss_mb = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(json.dumps({'wall_seconds': wall_seconds, 'peak_rss_mb': max(main_rss_mb, worker_rss_mb),
+                      'main_rss_mb': main_rss_mb, 'worker_rss_mb': worker_rss_mb}))
+
+# Function to run one pipeline in a fresh Python process, so each measurement starts from a clean memory state
+def run_pipeline_process(name, log_path, workers, use_cache):
+    command = [sys.executable, os.path.abspath(__file__), '--run-pipeline', name, '--log-path', log_path, '--workers', str(workers)]
+    if use_cache:
+        command.append('--use-cache')
+    result = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        error_lines = result.stderr.strip().splitlines()
+        return {'error': error_lines[-1] if error_lines else f"exit code {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# Function to get the current git commit, so results can be traced back to the code that produced them
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+# Function to benchmark the pipelines and return the results
+def run_benchmarks(names, workers, use_cache):
+    summary = prepare_logs()
+    results = {}
+    for name in names:
+        input_kind, pipeline = pipelines[name]
+        log_path, line_count = pipeline_input(input_kind, summary)
+        runs = [run_pipeline_process(name, log_path, workers, use_cache) for _ in range(repeat)]
+
+        errors = [run['error'] for run in runs if 'error' in run]
+        if errors:
+            results[name] = {'lines': line_count, 'error': errors[0]}
+            print(f"{name:16} skipped: {errors[0]}")
+            continue
+
+        wall_seconds = [run['wall_seconds'] for run in runs]
+        results[name] = {
+            'lines': line_count,
+            'wall_seconds': min(wall_seconds),
+            'wall_seconds_all': wall_seconds,
+            'lines_per_second': line_count / min(wall_seconds),
+            'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),  # The larger of main_rss_mb and worker_rss_mb
+            'main_rss_mb': max(run['main_rss_mb'] for run in runs),
+            'worker_rss_mb': max(run['worker_rss_mb'] for run in runs),  # Largest worker process, 0 without workers
+        }
+        peak_in = 'largest worker' if results[name]['worker_rss_mb'] > results[name]['main_rss_mb'] else 'main process'
+        print(f"{name:16} {results[name]['lines_per_second']:>12,.0f} lines/sec"
+              f" {min(wall_seconds):>8.2f} s {results[name]['peak_rss_mb']:>8.1f} MB peak ({peak_in})")
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'workers': workers,
+        'use_cache': use_cache,
+        'data': {'lines_per_file': summary['lines_per_file'], 'archive_count': summary['archive_count'], 'seed': summary['seed']},
+        'results': results,
+    }
+
+# Function to compare results with an earlier run and print the changes, flagging regressions
+# Returns the names of the pipelines that regressed
+def compare_results(current, previous):
+    if current['data'] != previous.get('data'):
+        print("Warning: the earlier results used different generated logs, comparisons may not be meaningful")
+
+    regressions = []
+    print(f"\nCompared with {previous.get('git_commit')} ({previous.get('created')}):")
+    for name, result in current['results'].items():
+        old_result = previous['results'].get(name)
+        if not old_result or 'error' in result or 'error' in old_result:
+            continue
+        speed_ratio = result['lines_per_second'] / old_result['lines_per_second']
+        memory_ratio = result['peak_rss_mb'] / old_result['peak_rss_mb']
+        regressed = speed_ratio < 1 - regression_threshold or memory_ratio > 1 + regression_threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:16} speed x{speed_ratio:.2f} memory x{memory_ratio:.2f}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the log pipelines on generated logs")
+    parser.add_argument('--lines', type=int, default=lines_per_file, help="lines per generated log file")
+    parser.add_argument('--archives', type=int, default=archive_count, help="rotated log files to generate")
+    parser.add_argument('--seed', type=int, default=seed, help="seed for the log generator")
+    parser.add_argument('--repeat', type=int, default=repeat, help="runs per pipeline")
+    parser.add_argument('--only', nargs='+', choices=sorted(pipelines), help="pipelines to run (default: all)")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes for pipelines that support them")
+    parser.add_argument('--use-cache', action='store_true', help="read .logcache files when fresh")
+    parser.add_argument('--output', default=results_path, help="where to save the JSON results")
+    parser.add_argument('--compare', help="earlier JSON results to compare with")
+    parser.add_argument('--run-pipeline', help=argparse.SUPPRESS)  # Used for the child processes
+    parser.add_argument('--log-path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_pipeline:
+        run_pipeline_here(args.run_pipeline, args.log_path, args.workers, args.use_cache)
+        sys.exit()
+
+    lines_per_file, archive_count, seed, repeat = args.lines, args.archives, args.seed, args.repeat
+    results = run_benchmarks(args.only or list(pipelines), args.workers, args.use_cache)
+    with open(args.output, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"Benchmark complete! Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            if compare_results(results, json.load(previous_file)):
+                sys.exit(1)
@@ -0,0 +1,125 @@
+# Script to generate realistic, deterministic nginx access logs for testing and benchmarking
+# The same settings and seed always produce the same files, so benchmark runs are comparable
+#
+# Writes a plain access.log plus rotated access.log.1 and access.log.N.gz archives, covering a mix of
+# browsers and bots, IPv4 and IPv6 visitors, site search URLs, deep folders, query strings and errors
+
+# Libraries
+import gzip
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+# Configuration
+output_folder = "bench-data/"  # Folder to write the generated logs to
+lines_per_file = 100000  # Lines in access.log and in each rotated file
+archive_count = 4  # Rotated files: access.log.1 (plain) and access.log.2.gz onwards
+seed = 42  # Change to get different (but still repeatable) logs
+
+# Traffic mix
+browser_agents = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36',
+]
+bot_agents = [
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)',
+    'Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)',
+    'Mozilla/5.0 (compatible; SemrushBot/7~bl; +http://www.semrush.com/bot.html)',
+    'Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; GPTBot/1.0; +https://openai.com/gptbot)',
+    'Cloudflare-Healthchecks/1.0',
+    'curl/8.4.0',
+]
+top_folders = ['services', 'about', 'blog', 'products', 'resources', 'careers', 'contact', 'events', 'api']
+sub_folders = ['seo', 'web-design', 'analytics', 'content', 'local', 'ecommerce', 'strategy', 'team', 'pricing']
+search_words = ['seo', 'web design', 'pricing', 'careers', 'contact us', 'analytics', 'wordpress', 'case study',
+                'local seo', 'ecommerce', 'content strategy', 'blog', 'accessibility', 'cro', 'hosting']
+asset_paths = ['/wp-content/themes/site/style.css', '/wp-content/themes/site/app.js', '/favicon.ico', '/robots.txt']
+
+# Function to build a random visitor IP: mostly IPv4, some IPv6
+def random_ip(rng):
+    if rng.random() < 0.2:
+        return '2001:db8:%x:%x::%x' % (rng.randrange(16), rng.randrange(256), rng.randrange(65536))
+    return '%d.%d.%d.%d' % (rng.randrange(1, 224), rng.randrange(256), rng.randrange(256), rng.randrange(1, 255))
+
+# Function to build a random request path
+def random_path(rng):
+    kind = rng.random()
+    if kind < 0.12:
+        return '/'
+    if kind < 0.22:
+        # Site search: popular terms from the vocabulary, plus random bot-sprayed queries
+        if rng.random() < 0.8:
+            term = rng.choice(search_words).replace(' ', '+')
+        else:
+            term = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(rng.randint(4, 12)))
+        page = '&page=%d' % rng.randint(2, 5) if rng.random() < 0.1 else ''
+        return '/search?q=%s%s' % (term, page)
+    if kind < 0.35:
+        return rng.choice(asset_paths) + ('?ver=%d' % rng.randint(1, 9) if rng.random() < 0.5 else '')
+    if kind < 0.45:
+        return '/blog/%s-post-%d/' % (rng.choice(sub_folders), rng.randint(1, 2000))
+
+    # Folder pages 1 to 5 levels deep, some with tracking or ID query strings
+    depth = rng.choice([1, 2, 2, 3, 3, 4, 5])
+    parts = [rng.choice(top_folders)] + [rng.choice(sub_folders) for _ in range(depth - 1)]
+    if depth >= 3 and rng.random() < 0.3:
+        parts[-1] += '-%d' % rng.randint(1, 5000)  # Faceted or ID-based URLs
+    path = '/' + '/'.join(parts) + '/'
+    if rng.random() < 0.15:
+        path += '?utm_source=%s&id=%d' % (rng.choice(['google', 'newsletter', 'linkedin']), rng.randint(1, 99999))
+    return path
+
+# Function to write one log file of random requests starting at a given time, returning the last timestamp
+# Requests are 0-2 seconds apart
+def write_log_file(file_path, rng, line_count, start_time, visitors):
+    opener = gzip.open if file_path.endswith('.gz') else open
+    timestamp = start_time
+    with opener(file_path, 'wt') as log_file:
+        for _ in range(line_count):
+            timestamp += timedelta(milliseconds=rng.randint(0, 2000))
+            ip, user_agent = rng.choice(visitors)
+            status = rng.choices([200, 301, 304, 404, 500], weights=[80, 5, 8, 6, 1])[0]
+            method = rng.choices(['GET', 'POST', 'HEAD'], weights=[92, 6, 2])[0]
+            log_file.write('%s - - [%s] %d "%s %s HTTP/1.1" %d "-" "%s"\n' % (
+                ip, timestamp.strftime('%d/%b/%Y:%H:%M:%S %z'), status, method, random_path(rng),
+                rng.randint(0, 80000) if status == 200 else 0, user_agent))
+    return timestamp
+
+# Function to write the logs: access.log is the newest, access.log.N.gz the oldest
+# Returns a summary of what was written, also saved as generated.json in the folder
+def generate_logs(output_folder, lines_per_file, archive_count, seed):
+    rng = random.Random(seed)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # A fixed pool of visitors, so IPs repeat like real sessions; about 1 in 4 is a bot
+    visitors = []
+    for _ in range(max(100, lines_per_file // 20)):
+        user_agent = rng.choice(bot_agents) if rng.random() < 0.25 else rng.choice(browser_agents)
+        visitors.append((random_ip(rng), user_agent))
+
+    file_names = ['access.log'] + ['access.log.%d%s' % (n, '' if n == 1 else '.gz') for n in range(1, archive_count + 1)]
+    timestamp = datetime(2024, 3, 1, tzinfo=timezone(timedelta(hours=-5)))
+    for file_name in reversed(file_names):  # Oldest first, so time keeps moving forward
+        file_path = os.path.join(output_folder, file_name)
+        timestamp = write_log_file(file_path, rng, lines_per_file, timestamp, visitors)
+        print(f"Wrote {file_path}")
+
+    summary = {
+        'lines_per_file': lines_per_file,
+        'archive_count': archive_count,
+        'seed': seed,
+        'files': file_names,
+    }
+    with open(os.path.join(output_folder, 'generated.json'), 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    generate_logs(output_folder, lines_per_file, archive_count, seed)
+
+    print(f"Generation complete! Logs saved to {output_folder}")
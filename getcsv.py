@@ -1,55 +1,24 @@
-# Script to analyze nginx logs to summarize homepage exit behavior
-#
-# 1. Loop through rotated logfile archives in ascending chronological order
-# 2. Parse to something clean using regex (array, sql, whatever)
-# 3. Record only rows that access the homepage, leaving a blank column for “page_exit_url”
-# 4. Eval every subsequent row: IF ip_address IN (step #2 dataset) AND page_exit_url NOT BLANK THEN UPDATE page_exit_url
+# Script to convert nginx logs into CSV (or Parquet or SQLite), one row per parsed log line
 
 # Libraries
-import re
-import csv
-from datetime import datetime
+from logengine import CsvExportReport, ParquetExportReport, SqliteExportReport, run_reports
 
 # Configuration
-log_file_path = "nginx-logs/access.log"  # Path to your log file
-export_path = "analysis.csv"             # Path to the CSV export file
+log_file_path = "nginx-logs/access.log"  # Path to your log file (or folder of .gz files)
+export_path = "analysis.csv"             # Path to the export file: .csv, .csv.gz, .csv.zst, .parquet or .sqlite
+workers = 1  # Processes for a folder of .gz files or a big log file, e.g. 8 on an 8-core machine (same output either way)
 
-# Regular expression to parse log lines
-log_pattern = re.compile(
-    r'(?P<ip>[\d\.:a-fA-F]+)\s+-\s+-\s+\[(?P<timestamp>.+?)\]\s+(?P<status>\d+)\s+"(?P<method>\w+)\s+(?P<path>.+?)\s+HTTP/\d\.\d"\s+(?P<size>\d+)\s+".+?"\s+"(?P<user_agent>.*?)"'
-)
+# Pick the export format from the file extension
+# .csv.zst needs zstandard (pip install zstandard) and .parquet needs pyarrow (pip install pyarrow)
+if export_path.endswith('.parquet'):
+    report = ParquetExportReport(export_path)
+elif export_path.endswith(('.sqlite', '.db')):
+    report = SqliteExportReport(export_path)
+else:
+    report = CsvExportReport(export_path)  # Plain, or gzip/zstd compressed for .gz/.zst
 
-# Function to parse a single log line
-def parse_log_line(line):
-    match = log_pattern.match(line)
-    if match:
-        # Parse timestamp
-        timestamp_str = match.group('timestamp')
-        timestamp = datetime.strptime(timestamp_str, "%d/%b/%Y:%H:%M:%S %z")
-        
-        return {
-            'ip_address': match.group('ip'),
-            'timestamp': timestamp,
-            'status_code': int(match.group('status')),
-            'method': match.group('method'),
-            'request_path': match.group('path'),
-            'response_size': int(match.group('size')),
-            'user_agent': match.group('user_agent'),
-        }
-    return None
+# Process the log file or folder and export parsed records
+if __name__ == "__main__":  # Needed for workers > 1 on Mac and Windows
+    run_reports(log_file_path, [report], workers=workers)
 
-# Function to process the log file and export matching records to CSV
-def export_filtered_logs(log_file_path, export_path):
-    with open(log_file_path, 'r') as log_file, open(export_path, 'w', newline='') as csv_file:
-        csv_writer = csv.DictWriter(csv_file, fieldnames=['ip_address', 'timestamp', 'status_code', 'method', 'request_path', 'response_size', 'user_agent'])
-        csv_writer.writeheader()
-        
-        for line in log_file:
-            log_data = parse_log_line(line)
-            if log_data:  # Check if log_data is not None
-                csv_writer.writerow(log_data)
-
-# Process the log file and export filtered records to CSV
-export_filtered_logs(log_file_path, export_path)
-
-print(f"Export complete! Filtered logs saved to {export_path}")
+    print(f"Export complete! Filtered logs saved to {export_path}")
@@ -0,0 +1,25 @@
+# Script to follow the active nginx log and keep near-real-time site search and tier1 drilldown reports
+# Every snapshot_interval seconds, writes one CSV per report and window, e.g. "live_search_terms_15m.csv"
+# Handles log rotation and truncation. Stop with Ctrl+C
+
+# Libraries
+from logengine import FolderSummaryReport, SearchTermsReport, run_live_reports
+
+# Configuration
+log_file_path = "nginx-logs/access.log"  # Path to the active log file
+bot_list = ['bot','googlebot', 'bingbot', 'yandex', 'baiduspider', 'ahrefsbot', 'semrushbot', 'dataforseo','gptbot','pinterestbot','Cloudflare-Healthchecks','makemerrybot','applebot','statuscake','pingdom']  # List of bots to exclude
+url_exceptions = ['contact', 'review', 'jsonapi', 'widget', 'blog', 'agreement','admincp','promokit']  # List of URL patterns to exclude
+search_url_path = "/search"  # Path for search requests
+search_param = "q"  # Query parameter for search term
+windows = [('15m', 15 * 60), ('1h', 60 * 60), ('24h', 24 * 60 * 60)]  # Rolling windows as (label, seconds)
+snapshot_interval = 60  # Seconds between CSV snapshots
+from_start = False  # Set to True to also count what's already in the log file, instead of only new lines
+
+# Reports to keep live - comment out any you don't need
+reports = [
+    SearchTermsReport("live_search_terms.csv", search_url_path, search_param),
+    FolderSummaryReport(1, "live_folder_summary.csv", bot_list, url_exceptions),
+]
+
+# Follow the log and write rolling-window snapshots until stopped
+run_live_reports(log_file_path, reports, windows, snapshot_interval, from_start=from_start)
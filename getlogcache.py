@@ -0,0 +1,17 @@
+# Script to convert a folder of .gz nginx log archives into columnar cache files for fast re-analysis
+# Each archive gets a "<archive>.logcache" file next to it. The other log scripts read the cache instead
+# of decompressing and parsing the archive again, as long as the archive's size and modified time match
+# Re-run after new archives arrive; archives with a fresh cache are skipped
+
+# Libraries
+from logengine import build_log_caches
+
+# Configuration
+log_folder = "nginx-logs/"  # Path to folder containing .gz log files
+workers = 1  # Processes to cache several archives at once, e.g. 8 on an 8-core machine
+
+# Build the cache of every archive that doesn't have a fresh one
+if __name__ == "__main__":  # Needed for workers > 1 on Mac and Windows
+    cache_paths = build_log_caches(log_folder, workers=workers)
+
+    print(f"Caching complete! {len(cache_paths)} archives cached")
@@ -0,0 +1,15 @@
+# Script to load a folder of .gz nginx log archives into an indexed SQLite log store for ad-hoc queries
+# Re-run after new archives arrive; archives already in the store are skipped, even after being renamed
+# Query the store with getstorereports.py, or any SQLite tool (see logstore.py for the tables)
+
+# Libraries
+from logstore import ingest_logs
+
+# Configuration
+log_folder = "nginx-logs/"  # Path to folder containing .gz log files
+store_path = "logs.sqlite"  # Path to the SQLite log store
+
+# Add the new archives to the store
+ingest_logs(log_folder, store_path)
+
+print(f"Ingest complete! Log store saved to {store_path}")
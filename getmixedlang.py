@@ -1,75 +1,506 @@
+# Script to crawl a site and detect mixed language content on every page
+#
+# Pages are fetched concurrently through a pooled requests.Session, with a limit on requests
+# per second to each host. Links are normalized so each page is fetched once, and each page
+# goes through language detection as soon as it arrives rather than after the whole crawl.
+# Each page is parsed once with lxml, and its text is split into one cleaned segment per block
+# element (paragraph, list item, table cell...), which detection handles one at a time.
+# Detection runs in batches on a pool of processes, each loading the language models once, and
+# results are cached by a hash of the page text, so unchanged pages aren't detected again next audit.
+# Fetched pages are kept in a page cache too: later audits send conditional requests and reuse the
+# cached copy when the server answers 304 Not Modified, and offline = True replays from it alone.
+#
+# Usage:
+#   python getmixedlang.py  # Crawl start_url with the settings below
+
 # Libraries
+import asyncio
+import codecs
+import csv
+import hashlib
+import json
 import regex
 import re
-import string
+import sqlite3
+import time
+import zlib
 import requests
-import lxml
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qsl, urldefrag, urlencode, urljoin, urlsplit, urlunsplit
 from lingua import Language, LanguageDetectorBuilder
 
+# Configuration
+start_url = "https://www.orbitmedia.com/"  # Page the crawl starts from
+export_path = "mixed_languages.csv"  # Path to the CSV with the languages of every page
+max_pages = 5000  # Stop queueing new pages after this many
+max_depth = 3  # Links to follow from the start page (0 checks just the start page)
+concurrency = 8  # Pages fetched at the same time
+host_rate_limit = 4  # Requests per second to each host (0 for no limit)
+request_timeout = 20  # Seconds to wait for a page
+same_site_only = True  # Only follow links on the start page's host
+page_cache_path = "mixed_languages_pages.sqlite"  # Pages from earlier audits, only downloaded again if they changed (None for no cache)
+page_cache_max_mb = 500  # Drop the least recently used pages once the page cache is bigger than this
+offline = False  # Replay the audit from the page cache, with no network requests
+detection_workers = 4  # Processes for language detection, e.g. 8 on an 8-core machine (1 detects in this process)
+detect_batch_size = 8  # Pages sent to a detection process at a time
+detection_cache_path = "mixed_languages_cache.sqlite"  # Detected languages by page text, reused by later audits (None for no cache)
+languages = [Language.ENGLISH, Language.FRENCH, Language.CHINESE, Language.JAPANESE]
+noise_words = ["LinkedIn", "Youtube", "Facebook", "Twitter", "Edit Post", "SaaS"]  # Removed from page text, ignoring case
+
 # Get data: https://www.topcoder.com/thrive/articles/web-crawler-in-python
-url = "https://www.orbitmedia.com/"
 headers = {
   'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.132 Safari/537.36 QIHU 360SE'
 }
-f = requests.get(url, headers = headers)
-linkslist = []
-soup = BeautifulSoup(f.content, 'lxml')
-
-# Get all links (to loop this in a crawl)
-print("\nGet all links from " + url + " for crawling:\n")
-links = soup.find_all('a', href=True)
-num = 0
-for atag in links:
-  print("url: " + atag['href'])
-
-# Function to remove tags: https://www.geeksforgeeks.org/remove-all-style-scripts-and-html-tags-using-beautifulsoup/
-def remove_tags(html):
- 
-    # End tags like sentences
-    html = html.replace("<", ".<")
-
-    # parse html content
-    soup = BeautifulSoup(html, "html.parser")
- 
-    for data in soup(['style', 'script']):
-        # Remove tags
-        data.decompose()
- 
-    # return data by retrieving the tag content
-    return ' '.join(soup.stripped_strings)
- 
-# Case insensitive replace
-def ireplace(old, repl, text):
-    return re.sub('(?i)'+re.escape(old), lambda m: repl, text)
-# Text cleanup
-
-# Return cleaned text
-print("\nJust the text from " + url + ":\n")
-cleantext = remove_tags(str(soup))
-cleantext = re.sub('[^0-9a-zA-Z.]+', ' ', cleantext)
-cleantext = cleantext.replace(" .", "") # extra dots
-cleantext = cleantext.replace("|", "\n")
-cleantext = cleantext.replace("-", "\n")
-ireplace("LinkedIn", "", cleantext) # case insensitive find/replace
-ireplace("Youtube", "", cleantext) # case insensitive find/replace
-ireplace("Facebook", "", cleantext) # case insensitive find/replace
-ireplace("Twitter", "", cleantext) # case insensitive find/replace
-ireplace("Edit Post", "", cleantext) # case insensitive find/replace
-ireplace("SaaS", "", cleantext) # case insensitive find/replace
-cleantext = cleantext.replace("  ", " ") # double space
-print(cleantext)
-
-# Detect the languages: https://pypi.org/project/lingua-language-detector/ -- degree of confidence
-print("\nDetected languages at " + url + ":\n")
-languages = [Language.ENGLISH, Language.FRENCH,Language.CHINESE,Language.JAPANESE]
-detector = LanguageDetectorBuilder.from_languages(*languages).build()
-confidence_values = detector.compute_language_confidence_values(cleantext)
-for language, value in confidence_values:
-  print(f"{language.name}: {value:.2f}")
-
-# Raw language values
-print("\nBreakdown of languages at " + url + ":\n")
-detector = LanguageDetectorBuilder.from_languages(*languages).build()
-for result in detector.detect_multiple_languages_of(cleantext):
-  print(f"{result.language.name}: '{cleantext[result.start_index:result.end_index]}'")
\ No newline at end of file
+default_ports = {'http': 80, 'https': 443}
+charset_pattern = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Text extraction: blocks split the text into segments, and skipped elements have no visible text
+block_tags = {'address', 'article', 'aside', 'blockquote', 'br', 'caption', 'dd', 'div', 'dl', 'dt', 'figcaption', 'footer',
+              'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'option', 'p', 'pre',
+              'section', 'table', 'td', 'th', 'title', 'tr', 'ul'}
+skip_tags = {'script', 'style', 'noscript', 'template'}
+
+# Text cleanup in one pass: noise words with the spaces around them, and runs of anything but letters, digits and dots
+not_word = r'[^\p{L}\p{M}\p{N}.]'
+noise_pattern = '|'.join(r'\s+'.join(regex.escape(part) for part in word.split()) for word in noise_words)
+cleanup_pattern = regex.compile(rf'{not_word}*\b(?:{noise_pattern})\b{not_word}*|{not_word}+', regex.IGNORECASE)
+letter_pattern = regex.compile(r'\p{L}')
+
+# Function to normalize a URL so the same page is only crawled once
+# Resolves it against the page it was found on, drops the #fragment, lowercases the host,
+# removes default ports and sorts the query string. Returns None for links that aren't web pages
+def normalize_url(url, base_url=None):
+    if base_url:
+        url = urljoin(base_url, url.strip())
+    url = urldefrag(url)[0]
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in default_ports or not parts.hostname:
+        return None  # mailto:, tel:, javascript: and the like
+    try:
+        port = parts.port
+    except ValueError:
+        return None
+    netloc = parts.hostname.lower()
+    if port and port != default_ports[scheme]:
+        netloc += f":{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+# Function to get the site a URL belongs to, treating www.example.com and example.com as the same site
+def site_host(url):
+    host = urlsplit(url).netloc
+    return host[4:] if host.startswith('www.') else host
+
+# Function to make a session whose connection pool can serve every concurrent request
+def make_session(pool_size):
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Spaces out requests to each host, so a crawl never sends more than requests_per_second to one server
+class HostRateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_times = {}  # Host -> earliest time the next request may start
+
+    async def wait(self, host):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        start_time = max(now, self.next_times.get(host, now))
+        self.next_times[host] = start_time + self.interval  # Claim the slot before sleeping
+        await asyncio.sleep(start_time - now)
+
+# On-disk cache of fetched pages, so repeat audits only download pages that changed
+# Bodies are stored zlib-compressed with their ETag and Last-Modified headers. Once the cache grows past
+# max_bytes, the least recently used pages are dropped
+class PageCache:
+    def __init__(self, cache_path, max_bytes):
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, final_url TEXT, status_code INTEGER, '
+                                'content_type TEXT, etag TEXT, last_modified TEXT, body BLOB, size INTEGER, last_used REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)')
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    # Returns the cached response for a URL as a dict, or None
+    def get(self, url):
+        row = self.connection.execute('SELECT final_url, status_code, content_type, etag, last_modified, body '
+                                      'FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute('UPDATE pages SET last_used = ? WHERE url = ?', (time.time(), url))
+        final_url, status_code, content_type, etag, last_modified, body = row
+        return {'final_url': final_url, 'status_code': status_code, 'content_type': content_type,
+                'etag': etag, 'last_modified': last_modified, 'body': zlib.decompress(body) if body is not None else None}
+
+    # Stores a fetched page, replacing any older copy
+    def put(self, page):
+        body = zlib.compress(page['body']) if page['body'] is not None else None
+        size = len(body) if body is not None else 0
+        old_row = self.connection.execute('SELECT size FROM pages WHERE url = ?', (page['url'],)).fetchone()
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (page['url'], page['final_url'], page['status_code'], page['content_type'],
+                                     page['etag'], page['last_modified'], body, size, time.time()))
+        self.total_bytes += size - (old_row[0] if old_row else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    # Drops the least recently used pages until the cache fits in max_bytes
+    def evict(self):
+        with self.connection:
+            for url, size in self.connection.execute('SELECT url, size FROM pages ORDER BY last_used').fetchall():
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.connection.execute('DELETE FROM pages WHERE url = ?', (url,))
+                self.total_bytes -= size
+
+    def close(self):
+        self.connection.close()
+
+# Function to fetch a page and collect its links (runs in a worker thread)
+# With a cached copy, the server is only asked for the page if it changed (If-None-Match / If-Modified-Since),
+# and the cached body is reused on 304 Not Modified. Without a session, the page comes from the cache alone
+# Returns a dict with the page's final URL, status code, body, links and text segments (None if it isn't HTML)
+def fetch_page(session, url, cached=None):
+    page = {'url': url, 'final_url': url, 'status_code': None, 'content_type': None, 'etag': None, 'last_modified': None,
+            'body': None, 'from_cache': False, 'segments': None, 'links': [], 'error': None}
+    if session is None:  # Offline replay
+        if cached is None:
+            page['error'] = "Not in the page cache"
+        else:
+            page.update(cached, from_cache=True)
+    else:
+        request_headers = {}
+        if cached and cached['etag']:
+            request_headers['If-None-Match'] = cached['etag']
+        if cached and cached['last_modified']:
+            request_headers['If-Modified-Since'] = cached['last_modified']
+        response = session.get(url, headers=request_headers, timeout=request_timeout, stream=True)
+        if response.status_code == 304 and cached:
+            page.update(cached, from_cache=True)
+        else:
+            page.update(final_url=response.url, status_code=response.status_code,
+                        content_type=response.headers.get('Content-Type', 'text/html'),
+                        etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+            if response.ok and 'html' in page['content_type']:
+                page['body'] = response.content  # Only HTML bodies are downloaded
+        response.close()
+
+    if page['body'] is not None:
+        page['links'], page['segments'] = extract_page(page['body'], page['content_type'], page['final_url'])
+    return page
+
+# Function to crawl a site, yielding each page as soon as it has been fetched
+# Pages come out in the order they finish, each with its depth (clicks from the start page)
+# offline=True replays the crawl from the page cache without any network requests
+async def crawl_pages(start_url, max_pages=max_pages, max_depth=max_depth, concurrency=concurrency,
+                      host_rate_limit=host_rate_limit, same_site_only=same_site_only,
+                      page_cache_path=page_cache_path, offline=offline):
+    start_url = normalize_url(start_url)
+    start_site = site_host(start_url)
+    seen = {start_url}
+    to_fetch = asyncio.Queue()
+    to_fetch.put_nowait((start_url, 0))
+    fetched = asyncio.Queue(maxsize=concurrency * 2)  # Holds back the crawl if detection falls behind
+    limiter = HostRateLimiter(host_rate_limit)
+    page_cache = PageCache(page_cache_path, page_cache_max_mb * 1024 * 1024) if page_cache_path else None
+    if offline and not page_cache:
+        raise ValueError("Offline replay needs a page cache (set page_cache_path)")
+    session = make_session(concurrency) if not offline else None
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    loop = asyncio.get_running_loop()
+
+    # Queues a link unless it was seen before, is off-site or the page limit is reached
+    def queue_link(link, depth):
+        if link in seen or len(seen) >= max_pages:
+            return
+        if same_site_only and site_host(link) != start_site:
+            return
+        seen.add(link)
+        to_fetch.put_nowait((link, depth))
+
+    async def crawl_worker():
+        while True:
+            url, depth = await to_fetch.get()
+            try:
+                try:
+                    cached = page_cache.get(url) if page_cache else None
+                    if session:
+                        await limiter.wait(urlsplit(url).netloc)
+                    page = await loop.run_in_executor(executor, fetch_page, session, url, cached)
+                    if page_cache and page['status_code'] is not None and not page['from_cache']:
+                        page_cache.put(page)
+                    page['body'] = None  # The links and text segments are all that's needed from here
+
+                    final_url = normalize_url(page['final_url'])
+                    if final_url and final_url != url:
+                        seen.add(final_url)  # Don't fetch a redirect target again when it's linked directly
+                    if depth < max_depth:
+                        for link in page['links']:
+                            queue_link(link, depth + 1)
+                except Exception as error:  # Request, parse or decode errors: the page is reported and the crawl goes on
+                    page = {'url': url, 'final_url': url, 'status_code': None, 'from_cache': False, 'segments': None, 'links': [], 'error': str(error) or type(error).__name__}
+                page['depth'] = depth
+                await fetched.put(page)
+            finally:
+                to_fetch.task_done()  # Always, or end_crawl would wait forever for this page
+
+    async def end_crawl():
+        await to_fetch.join()
+        await fetched.put(None)  # Every page is in the queue before this
+
+    tasks = [asyncio.create_task(crawl_worker()) for _ in range(concurrency)]
+    tasks.append(asyncio.create_task(end_crawl()))
+    try:
+        while True:
+            page = await fetched.get()
+            if page is None:
+                break
+            yield page
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        executor.shutdown(wait=True)
+        if session:
+            session.close()
+        if page_cache:
+            page_cache.close()
+
+# Function to get the encoding to parse a page with: the Content-Type charset, else UTF-8 if the body is valid UTF-8
+# Returns None to let lxml use the page's <meta charset>, since lxml falls back on Latin-1 for pages that don't declare one
+# A charset that isn't a known encoding (a typo or made-up name in the header) is ignored
+def page_encoding(content_type, body):
+    match = charset_pattern.search(content_type or '')
+    if match:
+        try:
+            codecs.lookup(match.group(1))
+            return match.group(1)
+        except LookupError:
+            pass
+    try:
+        body.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return None
+
+# Function to clean up the text of one block: drops noise words and runs of anything but letters, digits and dots
+# Every substitution is in cleanup_pattern, then whitespace runs become one space, so the same words always
+# give the same text (and detection cache key). Returns '' if no letters are left
+def clean_text(text):
+    text = ' '.join(cleanup_pattern.sub(' ', text).split())
+    return text if letter_pattern.search(text) else ''
+
+# Function to parse a page and collect its links and text in one walk of the lxml tree (runs in a fetch thread)
+# Script and style elements are skipped. Text is split at block elements like <p>, <li> and <td>, so each block
+# is cleaned and detected on its own. Returns the links and the (source line, text) segments of the page
+# An empty body (or one with no elements at all) is a page with no links and no text
+def extract_page(body, content_type, base_url):
+    try:
+        parser = lxml.html.HTMLParser(encoding=page_encoding(content_type, body))
+    except LookupError:
+        parser = lxml.html.HTMLParser()  # An encoding Python knows under a name libxml2 doesn't, like koi8_r
+    try:
+        root = lxml.html.document_fromstring(body, parser=parser)
+    except etree.ParserError:
+        return [], []
+    links = []
+    segments = []
+    block_text = []  # Pieces of the current block's text
+    block_line = None  # Source line the current block's text starts on
+
+    def add_text(text, line):
+        nonlocal block_line
+        if text and not text.isspace():
+            if not block_text:
+                block_line = line
+            block_text.append(text)
+
+    def end_block():
+        if block_text:
+            text = clean_text(''.join(block_text))
+            if text:
+                segments.append((block_line, text))
+            block_text.clear()
+
+    walker = etree.iterwalk(root, events=('start', 'end', 'comment', 'pi'))
+    for event, element in walker:
+        if event == 'start':
+            if element.tag in skip_tags:
+                walker.skip_subtree()  # Its tail still comes with the end event
+                continue
+            if element.tag == 'a' and element.get('href'):
+                link = normalize_url(element.get('href'), base_url)
+                if link:
+                    links.append(link)
+            if element.tag in block_tags:
+                end_block()
+            add_text(element.text, element.sourceline)
+        else:
+            if event == 'end' and element.tag in block_tags:
+                end_block()
+            add_text(element.tail, element.sourceline)  # Text after a tag or comment belongs to the enclosing block
+    end_block()
+    return links, segments
+
+# Detector for this process, built once by start_detector and shared by every page
+detector = None
+
+# Function to build the language detector once per process (also the initializer of each detection worker)
+# Loading the language models is the slow part, so the detector is never rebuilt per page
+def start_detector():
+    global detector
+    if detector is None:
+        detector = LanguageDetectorBuilder.from_languages(*languages).build()
+
+# Function to detect the languages of a page from its text segments
+# Returns the confidence for each language (averaged over the segments, weighted by length), the share of
+# the text detected as each language, and the source lines of the segments that are mostly in each language.
+# Everything is keyed by language name so results can be sent between processes and cached as JSON
+def detect_languages(segments):
+    start_detector()
+    total_length = sum(len(text) for line, text in segments)
+    confidences = {language.name: 0.0 for language in languages}
+    lengths = {}
+    language_lines = {}
+
+    for line, text in segments:
+        # Detect the languages: https://pypi.org/project/lingua-language-detector/ -- degree of confidence
+        weight = len(text) / total_length
+        for confidence in detector.compute_language_confidence_values(text):
+            confidences[confidence.language.name] += confidence.value * weight
+
+        # Raw language values
+        segment_lengths = {}
+        for result in detector.detect_multiple_languages_of(text):
+            name = result.language.name
+            segment_lengths[name] = segment_lengths.get(name, 0) + result.end_index - result.start_index
+        for name, length in segment_lengths.items():
+            lengths[name] = lengths.get(name, 0) + length
+        if segment_lengths:
+            language_lines.setdefault(max(segment_lengths, key=segment_lengths.get), []).append(line)
+
+    return confidences, {name: length / total_length for name, length in lengths.items()}, language_lines
+
+# Function to detect the languages of a batch of pages (runs in a detection worker)
+# Sending pages in batches keeps the cost of passing text between processes small
+def detect_languages_batch(pages_segments):
+    return [detect_languages(segments) for segments in pages_segments]
+
+# Function to get the cache key of a page's text: a hash of its segments and the languages it was checked for
+# Source lines are part of the key, since the cached results hold them: text moved by a markup change is detected again
+def detection_key(segments):
+    text_hash = hashlib.sha256(','.join(language.name for language in languages).encode('utf-8'))
+    for line, text in segments:
+        text_hash.update(f'\n{line}\t{text}'.encode('utf-8'))
+    return text_hash.hexdigest()
+
+# Function to open the detection cache, creating it on the first run
+def open_detection_cache(cache_path):
+    connection = sqlite3.connect(cache_path)
+    connection.execute('CREATE TABLE IF NOT EXISTS detections (text_hash TEXT PRIMARY KEY, results TEXT)')
+    return connection
+
+# Function to get the cached detection of a page's text, or None if it hasn't been detected before
+def cached_detection(cache, key):
+    row = cache.execute('SELECT results FROM detections WHERE text_hash = ?', (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+# Function to crawl the site and write the languages of each page to the CSV as pages arrive
+# Pages whose text is in the cache are written right away. The rest are detected in batches of
+# detect_batch_size, spread over detection_workers processes while the crawl continues
+async def audit_site(start_url, export_path, detection_workers=detection_workers, cache_path=detection_cache_path, **crawl_options):
+    loop = asyncio.get_running_loop()
+    cache = open_detection_cache(cache_path) if cache_path else None
+    pool = ProcessPoolExecutor(detection_workers, initializer=start_detector) if detection_workers > 1 else None
+    counts = {'pages': 0, 'mixed': 0, 'cached': 0, 'unchanged': 0}
+    batch = []  # (page, key) waiting for detection
+    running = set()  # Batches being detected
+
+    csvfile = open(export_path, 'w', newline='')
+    writer = csv.writer(csvfile)
+    writer.writerow(['URL', 'Depth', 'Status Code'] + [language.name for language in languages]
+                    + ['Mixed Languages', 'Mixed Language Lines', 'Error'])
+
+    # Writes a page's row to the CSV
+    def write_page(page, confidences, shares, language_lines):
+        counts['pages'] += 1
+        if page['from_cache']:
+            counts['unchanged'] += 1
+
+        # Languages that make up at least 1% of the page, largest first
+        mixed = sorted((name for name, share in shares.items() if share >= 0.01), key=shares.get, reverse=True)
+        if len(mixed) > 1:
+            counts['mixed'] += 1
+        # Source lines of the blocks in the page's other languages, e.g. "FRENCH: 12, 40"
+        mixed_lines = '; '.join(f"{name}: {', '.join(str(line) for line in language_lines.get(name, [])[:10])}" for name in mixed[1:])
+        writer.writerow([page['url'], page['depth'], page['status_code']]
+                        + [f"{confidences.get(language.name, 0.0):.2f}" for language in languages]
+                        + [', '.join(f"{name} {shares[name]:.0%}" for name in mixed), mixed_lines, page['error'] or ''])
+
+        summary = ', '.join(f"{name} {shares[name]:.0%}" for name in mixed) or page['error'] or page['status_code']
+        print(f"[{counts['pages']}] {page['url']}: {summary}")
+
+    # Detects a batch of pages, then caches and writes the results
+    async def detect_batch(pages):
+        pages_segments = [page['segments'] for page, key in pages]
+        if pool:
+            results = await loop.run_in_executor(pool, detect_languages_batch, pages_segments)
+        else:
+            results = detect_languages_batch(pages_segments)
+        for (page, key), result in zip(pages, results):
+            if cache:
+                cache.execute('INSERT OR REPLACE INTO detections VALUES (?, ?)', (key, json.dumps(result)))
+            write_page(page, *result)
+        if cache:
+            cache.commit()
+
+    try:
+        async for page in crawl_pages(start_url, **crawl_options):
+            if not page['segments']:
+                write_page(page, {}, {}, {})
+                continue
+
+            key = detection_key(page['segments'])
+            cached = cached_detection(cache, key) if cache else None
+            if cached:
+                counts['cached'] += 1
+                write_page(page, *cached)
+                continue
+
+            batch.append((page, key))
+            if len(batch) >= detect_batch_size:
+                running.add(asyncio.create_task(detect_batch(batch)))
+                batch = []
+                # Wait for a batch to finish once every worker has two queued, so texts don't pile up
+                if len(running) >= detection_workers * 2:
+                    done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()  # Raises any detection error
+
+        if batch:
+            running.add(asyncio.create_task(detect_batch(batch)))
+        for task in running:
+            await task
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        if cache:
+            cache.close()
+        csvfile.close()
+
+    print(f"\nCrawled {counts['pages']:,} pages ({counts['unchanged']:,} unchanged in the page cache),"
+          f" {counts['mixed']:,} with mixed languages ({counts['cached']:,} from the detection cache). Results saved to {export_path}")
+
+if __name__ == "__main__":
+    asyncio.run(audit_site(start_url, export_path))
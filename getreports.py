@@ -0,0 +1,37 @@
+# Script to run several log reports over the same logs in a single pass
+# Each log line is read, decompressed and parsed once, then sent to every report below
+# Page CTR follows visitors across files, so it gets its own pass over the logs merged in time order
+
+# Libraries
+from logengine import FolderSummaryReport, PageCtrReport, SearchTermsReport, run_reports
+
+# Configuration
+log_path = "nginx-logs/"  # Path to your log file (or folder of .gz files)
+bot_list = ['bot','googlebot', 'bingbot', 'yandex', 'baiduspider', 'ahrefsbot', 'semrushbot', 'dataforseo','gptbot','pinterestbot','Cloudflare-Healthchecks','makemerrybot','applebot','statuscake','pingdom']  # List of bots to exclude
+url_exceptions = ['contact', 'review', 'jsonapi', 'widget', 'blog', 'agreement','admincp','promokit']  # List of URL patterns to exclude
+search_url_path = "/search"  # Path for search requests
+search_param = "q"  # Query parameter for search term
+filter_path = "/"  # Path for the page CTR report, e.g., homepage "/"
+workers = 1  # Processes for a folder of .gz files or a big log file, e.g. 8 on an 8-core machine (the page CTR pass always uses 1)
+
+# Reports to run - comment out any you don't need
+reports = [
+    FolderSummaryReport(1, "folder_summary.csv", bot_list, url_exceptions),
+    FolderSummaryReport(2, "tier2_folder_summary.csv", bot_list, url_exceptions),
+    FolderSummaryReport(3, "tier3_folder_summary.csv", bot_list, url_exceptions),
+    SearchTermsReport("search_terms_analysis.csv", search_url_path, search_param),
+    # CsvExportReport("analysis.csv"),  # Also add CsvExportReport to the import above
+]
+
+# Reports that follow visitors, run in time order - empty the list to skip the second pass
+chronological_reports = [
+    PageCtrReport("page_ctr_summary.csv", filter_path),
+]
+
+# Read the logs once and export every report
+if __name__ == "__main__":  # Needed for workers > 1 on Mac and Windows
+    run_reports(log_path, reports, workers=workers)
+    if chronological_reports:
+        run_reports(log_path, chronological_reports, chronological=True)
+
+    print("Processing complete! All reports saved.")
@@ -0,0 +1,30 @@
+# Script to run the drilldown, site search and page CTR reports as SQL queries against the log store
+# Takes seconds instead of rescanning the logs. Build or update the store first with getlogstore.py
+
+# Libraries
+from logengine import FolderSummaryReport, PageCtrReport, SearchTermsReport
+from logstore import run_store_reports
+
+# Configuration
+store_path = "logs.sqlite"  # Path to the SQLite log store
+start = None  # Set to e.g. "2024-03-01" to only count lines from that date on (UTC)
+end = None  # Set to e.g. "2024-04-01" to only count lines before that date (UTC)
+bot_list = ['bot','googlebot', 'bingbot', 'yandex', 'baiduspider', 'ahrefsbot', 'semrushbot', 'dataforseo','gptbot','pinterestbot','Cloudflare-Healthchecks','makemerrybot','applebot','statuscake','pingdom']  # List of bots to exclude
+url_exceptions = ['contact', 'review', 'jsonapi', 'widget', 'blog', 'agreement','admincp','promokit']  # List of URL patterns to exclude
+search_url_path = "/search"  # Path for search requests
+search_param = "q"  # Query parameter for search term
+filter_path = "/"  # Path for the page CTR report, e.g., homepage "/"
+
+# Reports to run - comment out any you don't need
+reports = [
+    FolderSummaryReport(1, "folder_summary.csv", bot_list, url_exceptions),
+    FolderSummaryReport(2, "tier2_folder_summary.csv", bot_list, url_exceptions),
+    FolderSummaryReport(3, "tier3_folder_summary.csv", bot_list, url_exceptions),
+    SearchTermsReport("search_terms_analysis.csv", search_url_path, search_param),
+    PageCtrReport("page_ctr_summary.csv", filter_path),
+]
+
+# Query the store and export every report
+run_store_reports(store_path, reports, start, end)
+
+print("Processing complete! All reports saved.")
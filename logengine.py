@@ -0,0 +1,2164 @@
+# Shared log engine: reads, decompresses and parses each log line once, then hands the
+# parsed records to every registered report. Logs are parsed a block at a time into
+# column batches (one list per field), so reports can count repeated values in bulk
+#
+# Usage:
+#   reports = [
+#       FolderSummaryReport(1, "folder_summary.csv", bot_list, url_exceptions),
+#       SearchTermsReport("search_terms_analysis.csv", "/search", "q"),
+#   ]
+#   run_reports("nginx-logs/", reports)
+#
+# Pass workers=N to spread a folder of .gz archives across N processes. Each worker fills
+# an empty copy of every report, and the copies are merged back in file order, so the
+# output is identical to a serial run (except top-K search terms, whose counts are approximate
+# and depend on how the lines were split). A single plain log file is split into
+# newline-aligned byte ranges instead, merged back in file order the same way.
+#
+# run_live_reports follows the active access.log instead, keeping rolling-window totals
+# (e.g., last 15 minutes, hour and day) and writing CSV snapshots on a fixed interval.
+#
+# Pass state_path="tier2_state.pkl" for incremental runs: the totals and a manifest of the
+# archives already counted are saved there, and later runs only parse new archives.
+#
+# Each run also saves run stats next to the first report's export (e.g. "folder_summary.stats.json"):
+# time per stage, lines in and out of every filter, and examples of lines log_pattern didn't match.
+
+# Libraries
+import re
+import copy
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import locale
+import math
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import time
+import zlib
+from multiprocessing import Pool
+from queue import Full, Queue
+from threading import Event, Lock, Thread
+from urllib.parse import parse_qs, urlparse
+from array import array
+from collections import Counter, OrderedDict, defaultdict, deque
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+
+from logformat import compile_log_format
+
+# Faster zlib-compatible decompression when python-isal or zlib-ng is installed (pip install isal)
+try:
+    from isal import isal_zlib as zlib_backend
+except ImportError:
+    try:
+        from zlib_ng import zlib_ng as zlib_backend
+    except ImportError:
+        zlib_backend = zlib
+
+# Your server's log format, as the nginx log_format or Apache LogFormat string from its config, e.g.
+# '$remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent"'
+# Lines are then parsed by a parser generated for that format (see logformat.py and testparse.py).
+# None parses with log_pattern below
+log_format = None
+
+# Regular expression to parse log lines when log_format is None
+log_pattern = re.compile(
+    r'(?P<ip>[\d\.:a-fA-F]+)\s+-\s+-\s+\[(?P<timestamp>.+?)\]\s+(?P<status>\d+)\s+"(?P<method>\w+)\s+(?P<path>.+?)\s+HTTP/\d\.\d"\s+(?P<size>\d+)\s+".+?"\s+"(?P<user_agent>.*?)"'
+)
+
+# The same pattern for a whole block of lines at once: every match starts at a line start, and \s becomes
+# [^\S\n] so no match runs into the next line. Lines match here exactly when they match log_pattern
+batch_log_pattern = re.compile('^' + log_pattern.pattern.replace(r'\s', r'[^\S\n]'), re.MULTILINE)
+batch_group_fields = {'ip': 'ip_address', 'timestamp': 'timestamp', 'status': 'status_code', 'method': 'method',
+                      'path': 'request_path', 'size': 'response_size', 'user_agent': 'user_agent'}
+
+# Skip lines that no report wants with cheap substring checks before the full regex
+# The checks assume fields are separated by single spaces, as nginx writes them; set to False if yours differ
+use_prefilter = True
+
+# Read .gz archives from their columnar cache file (built by getlogcache.py) when it is fresh
+use_log_cache = True
+log_cache_version = 1
+
+# Version of the incremental state file written by run_reports(state_path=...)
+report_state_version = 1
+
+# Logs are read in binary blocks of this size, and a background thread decompresses up to
+# read_ahead_blocks blocks ahead (continuing into the next archive) while lines are parsed
+log_block_size = 1024 * 1024
+read_ahead_blocks = 16
+
+# Size of the byte ranges a single plain log file is split into when workers > 1
+log_range_size = 64 * 1024 * 1024
+
+# Run stats (time per stage, lines in and out per filter, unmatched lines) are saved as a JSON sidecar next
+# to the first report's export, e.g. "tier2_folder_summary.stats.json". Stage times are measured on one
+# line in stats_sample_every and scaled up, so the counters stay cheap enough to leave on
+use_run_stats = True
+stats_sample_every = 64
+stats_unmatched_samples = 5  # Unmatched lines kept as examples
+progress_interval = 10  # Seconds between progress lines during a run (None for none)
+
+# Encoding used to read plain log files in byte ranges, same as open() uses by default
+log_encoding = locale.getpreferredencoding(False)
+
+# Month abbreviations used in nginx timestamps
+month_numbers = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6, 'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+
+# Memoized timestamps: thousands of consecutive lines share the same second and minute
+timestamp_cache = {}  # Full timestamp string -> datetime
+minute_cache = {}  # Timestamp string without seconds -> datetime at the start of that minute
+timezone_cache = {}  # "-0500" -> timezone
+timestamp_cache_size = 100000  # Caches are emptied when they reach this many entries
+
+# Interning tables for state held across many lines: one shared string per distinct method, path or
+# user agent, instead of a new copy from every line that has it
+interned_fields = ('method', 'request_path', 'user_agent')
+intern_tables = {field: {} for field in interned_fields}  # Field -> {value: the shared copy of value}
+intern_table_size = 100000  # Tables are emptied when they reach this many entries, like the timestamp caches
+
+# Columns of a parsed log line, in CSV export order
+log_fields = ['ip_address', 'timestamp', 'status_code', 'method', 'request_path', 'response_size', 'user_agent']
+
+# Parser generated from log_format, if set
+log_parser = compile_log_format(log_format, log_fields) if log_format else None
+
+# Rows the export reports buffer before each write (one Parquet row group, or one SQLite transaction)
+export_batch_size = 100000
+
+# Function to parse the start of the minute of an nginx timestamp like "10/Oct/2024:13:55:36 -0700"
+def parse_timestamp_minute(timestamp_str):
+    zone = timestamp_str[21:]
+    tzinfo = timezone_cache.get(zone)
+    if tzinfo is None:
+        offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[3:5]))
+        tzinfo = timezone(-offset if zone[0] == '-' else offset)
+        timezone_cache[zone] = tzinfo
+    return datetime(int(timestamp_str[7:11]), month_numbers[timestamp_str[3:6]], int(timestamp_str[0:2]),
+                    int(timestamp_str[12:14]), int(timestamp_str[15:17]), tzinfo=tzinfo)
+
+# Function to turn a raw log timestamp into a datetime, only called by reports that need one
+# Gives the same values as datetime.strptime(timestamp_str, "%d/%b/%Y:%H:%M:%S %z")
+def parse_timestamp(timestamp_str):
+    timestamp = timestamp_cache.get(timestamp_str)
+    if timestamp is not None:
+        return timestamp
+
+    if len(timestamp_cache) >= timestamp_cache_size:
+        timestamp_cache.clear()
+        minute_cache.clear()
+
+    try:
+        if len(timestamp_str) != 26 or timestamp_str[20] != ' ' or timestamp_str[21] not in '+-':
+            raise ValueError(timestamp_str)
+        minute_key = timestamp_str[:17] + timestamp_str[20:]
+        minute_start = minute_cache.get(minute_key)
+        if minute_start is None:
+            minute_start = parse_timestamp_minute(timestamp_str)
+            minute_cache[minute_key] = minute_start
+        timestamp = minute_start.replace(second=int(timestamp_str[18:20]))
+    except (ValueError, KeyError):
+        # Anything unusual goes through the slow path, which raises on a bad timestamp like before
+        timestamp = datetime.strptime(timestamp_str, "%d/%b/%Y:%H:%M:%S %z")
+
+    timestamp_cache[timestamp_str] = timestamp
+    return timestamp
+
+# Function to get the shared copy of a field's value from its interning table
+def intern_value(field, value):
+    table = intern_tables[field]
+    shared_value = table.get(value)
+    if shared_value is None:
+        if len(table) >= intern_table_size:
+            table.clear()
+        shared_value = table[value] = value
+    return shared_value
+
+# Function to parse a single log line
+# The timestamp is kept as the raw string; use parse_timestamp() when a report needs a datetime
+def parse_log_line(line):
+    if log_parser:
+        return log_parser.parse_line(line)
+    match = log_pattern.match(line)
+    if match:
+        return {
+            'ip_address': match.group('ip'),
+            'timestamp': match.group('timestamp'),
+            'status_code': int(match.group('status')),
+            'method': match.group('method'),
+            'request_path': match.group('path'),
+            'response_size': int(match.group('size')),
+            'user_agent': match.group('user_agent'),
+        }
+    return None
+
+# Function to parse a block of log lines into a column batch: a dict of field -> list of values, one per
+# matching line, in log order. One findall call parses every line, without a dict or match object per line
+def parse_log_block(text):
+    if log_parser:
+        return log_parser.parse_block(text)
+    rows = batch_log_pattern.findall(text)
+    if not rows:
+        return {field: [] for field in log_fields}
+    columns = list(zip(*rows))
+    batch = {batch_group_fields[name]: columns[index - 1] for name, index in batch_log_pattern.groupindex.items()}
+    return {field: list(map(int, batch[field])) if field in ('status_code', 'response_size') else list(batch[field])
+            for field in log_fields}
+
+# Function to build a cheap check on the raw line that rejects lines before the full regex runs
+# Returns None when there is nothing to check. A line passing the check still gets the full parse
+# With as_bytes, the check runs on undecoded lines, so rejected lines are never decoded either
+def make_line_filter(status=None, method=None, path_contains=None, as_bytes=False):
+    tokens = line_filter_tokens(status, method, path_contains, as_bytes)
+    if not tokens:
+        return None
+    if len(tokens) == 1:
+        token = tokens[0]
+        return lambda line: token in line
+    first_token, second_token = tokens
+    return lambda line: first_token in line and second_token in line
+
+# Function to get the substrings a line needs to contain to pass the line filter (none to keep every line)
+def line_filter_tokens(status=None, method=None, path_contains=None, as_bytes=False):
+    tokens = []
+    if path_contains:
+        tokens.append(path_contains)  # Checked first, it's usually the rarest
+    if log_parser is None:  # These know where log_pattern has the status and method, not other formats
+        if status is not None and method is not None:
+            tokens.append(f'] {status} "{method} ')
+        elif status is not None:
+            tokens.append(f'] {status} "')
+        elif method is not None:
+            tokens.append(f'"{method} ')
+
+    if not use_prefilter:
+        return []
+    if as_bytes:
+        tokens = [token.encode(log_encoding) for token in tokens]
+    return tokens
+
+# Function to build the line filter that keeps every line at least one of the reports needs
+def make_reports_line_filter(reports, as_bytes=False):
+    return make_line_filter(*shared_report_needs(reports), as_bytes=as_bytes)
+
+# Function to find the status, method and path substring every report needs (None where they differ)
+def shared_report_needs(reports):
+    def shared(attribute):
+        values = {getattr(report, attribute) for report in reports}
+        return values.pop() if len(values) == 1 else None
+
+    return shared('status'), shared('method'), shared('path_contains')
+
+# Function to extract the folder at a given depth from the request path (ignoring URL variables)
+# Depth 1 is "/services", depth 2 is "/services/seo", and so on
+def extract_folder(request_path, depth):
+    parsed_url = urlparse(request_path)
+    path = parsed_url.path  # Ignore the query string (i.e., no URL variables)
+
+    # Remove leading/trailing slashes and split by "/"
+    path_parts = path.strip("/").split("/")
+
+    # Return the first parts of the path as the folder
+    if len(path_parts) >= depth:
+        return "/" + "/".join(path_parts[:depth])  # Ensure it starts with "/"
+    return None
+
+# Checks whether a string contains any of a list of patterns, using one regex compiled from the whole list
+# Results are cached per distinct string, since the same user agents and paths repeat millions of times
+# With ignore_case, both the patterns and the string are lowercased, so 'Cloudflare-Healthchecks' matches too
+class PatternMatcher:
+    def __init__(self, patterns, ignore_case=False, cache_size=65536):
+        self.patterns = [pattern.lower() for pattern in patterns] if ignore_case else list(patterns)
+        self.ignore_case = ignore_case
+        self.cache_size = cache_size
+        self.compile()
+
+    def compile(self):
+        if not self.patterns:
+            self.matches = lambda text: False  # An empty alternation would match everything
+            return
+
+        search = re.compile('|'.join(re.escape(pattern) for pattern in self.patterns)).search
+        if self.ignore_case:
+            matches = lambda text: search(text.lower()) is not None
+        else:
+            matches = lambda text: search(text) is not None
+        self.matches = lru_cache(maxsize=self.cache_size)(matches)
+
+    # The compiled regex and cache are rebuilt after pickling (e.g., when sent to a worker process)
+    def __getstate__(self):
+        return {'patterns': self.patterns, 'ignore_case': self.ignore_case, 'cache_size': self.cache_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compile()
+
+# Function to extract search terms from the request path
+def extract_search_term(request_path, search_url_path, search_param):
+    parsed_url = urlparse(request_path)
+    if parsed_url.path.startswith(search_url_path):
+        query_params = parse_qs(parsed_url.query)
+        if search_param in query_params:
+            return query_params[search_param][0]  # Return the first value for the search parameter
+    return None
+
+# Function to open a plain or .gz compressed log file as text
+def open_log_file(log_file_path):
+    if log_file_path.endswith('.gz'):
+        return gzip.open(log_file_path, 'rt')  # 'rt' mode reads the file as text
+    return open(log_file_path, 'r')
+
+# Function to list the log files to read: a single file, or every .gz file in a folder
+# With include_plain, uncompressed logs like access.log and access.log.1 in the folder are included too
+def list_log_files(log_path, include_plain=False):
+    if not os.path.isdir(log_path):
+        return [log_path]
+
+    log_file_paths = []
+    for file_name in os.listdir(log_path):
+        if file_name.endswith('.gz') or (include_plain and re.search(r'\.log(\.\d+)?$', file_name)):
+            log_file_paths.append(os.path.join(log_path, file_name))
+        elif not file_name.endswith(('.logcache', '.logcache.tmp')):  # Cache files are read with their archive
+            print(f"Skipping non-.gz file: {file_name}")
+    return log_file_paths
+
+# Approximate set of strings with fixed memory (HyperLogLog), used for unique subpage counts
+# Supports add(), len() and |= like a set. Small sets are kept exact until they outgrow the sketch,
+# and sketches with the same error merge without losing accuracy, so per-file and parallel runs work
+class HyperLogLog:
+    def __init__(self, error=0.01):
+        # The standard error of the estimate is about 1.04 / sqrt(number of registers)
+        self.precision = min(18, max(4, math.ceil(math.log2((1.04 / error) ** 2))))
+        self.exact = set()  # Exact values until there are more than exact_limit of them
+        self.exact_limit = (1 << self.precision) // 32
+        self.registers = None
+
+    def add(self, value):
+        if self.registers is None:
+            self.exact.add(value)
+            if len(self.exact) > self.exact_limit:
+                self.switch_to_registers()
+            return
+
+        value_hash = int.from_bytes(hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+        index = value_hash >> (64 - self.precision)  # First bits choose the register
+        remaining_bits = 64 - self.precision
+        rank = remaining_bits - (value_hash & ((1 << remaining_bits) - 1)).bit_length() + 1  # Position of the first 1 bit
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def switch_to_registers(self):
+        self.registers = bytearray(1 << self.precision)
+        exact, self.exact = self.exact, None
+        for value in exact:
+            self.add(value)
+
+    def __ior__(self, other):
+        if self.precision != other.precision:
+            raise ValueError("Can't merge HyperLogLog sketches with different error settings")
+
+        if other.registers is None:
+            for value in other.exact:
+                self.add(value)
+            return self
+
+        if self.registers is None:
+            self.switch_to_registers()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def __len__(self):
+        if self.registers is None:
+            return len(self.exact)
+
+        register_count = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(register_count, 0.7213 / (1 + 1.079 / register_count))
+        estimate = alpha * register_count * register_count / sum(2.0 ** -rank for rank in self.registers)
+        empty_registers = self.registers.count(0)
+        if estimate <= 2.5 * register_count and empty_registers:
+            estimate = register_count * math.log(register_count / empty_registers)  # Small range correction
+        return round(estimate)
+
+# Function to get the k terms with the highest counts, highest first and equal counts in term order
+# The fixed order of ties keeps which terms are kept, and the order they're written in, the same on every run
+def top_terms(counts, k):
+    return heapq.nsmallest(k, counts, key=lambda term: (-counts[term], term))
+
+# Approximate top-K counter with fixed memory (Space-Saving), used for heavy-hitter search terms
+# Keeps at most `capacity` terms. A new term replaces the least counted one and inherits its count,
+# so every reported count is at most `error` too high, and any term counted more than the smallest
+# kept count is guaranteed to be in the summary. Summaries merge across files and workers, but a merged
+# summary is an approximation of its own: with workers, the kept terms and their errors can differ from a serial run
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}  # Term -> count (may be too high by up to its error)
+        self.errors = {}  # Term -> count inherited from the term it replaced
+        self.heap = []  # (count, term) with one entry per term; entries can be stale until popped
+
+    def add(self, term):
+        if term in self.counts:
+            self.counts[term] += 1
+            return
+
+        if len(self.counts) < self.capacity:
+            self.counts[term] = 1
+            self.errors[term] = 0
+            heapq.heappush(self.heap, (1, term))
+            return
+
+        # Find the least counted term. Counts only grow, so a stale heap entry is pushed back with its current count
+        while True:
+            count, smallest_term = heapq.heappop(self.heap)
+            current_count = self.counts[smallest_term]
+            if count == current_count:
+                break
+            heapq.heappush(self.heap, (current_count, smallest_term))
+
+        del self.counts[smallest_term]
+        del self.errors[smallest_term]
+        self.counts[term] = count + 1
+        self.errors[term] = count
+        heapq.heappush(self.heap, (count + 1, term))
+
+    # Smallest kept count, which bounds the count of any term that isn't kept (0 while not full)
+    def min_count(self):
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def __ior__(self, other):
+        # A term missing from one summary may have been counted up to that summary's smallest count
+        self_missing, other_missing = self.min_count(), other.min_count()
+        counts, errors = {}, {}
+        for term in self.counts.keys() | other.counts.keys():
+            counts[term] = self.counts.get(term, self_missing) + other.counts.get(term, other_missing)
+            errors[term] = self.errors.get(term, self_missing) + other.errors.get(term, other_missing)
+
+        kept_terms = top_terms(counts, self.capacity)
+        self.counts = {term: counts[term] for term in kept_terms}
+        self.errors = {term: errors[term] for term in kept_terms}
+        self.heap = [(count, term) for term, count in self.counts.items()]
+        heapq.heapify(self.heap)
+        return self
+
+    # Returns the k most counted terms as (term, count, error), highest first, without sorting every term
+    def most_common(self, k):
+        return [(term, self.counts[term], self.errors[term]) for term in top_terms(self.counts, k)]
+
+# Base report: receives every parsed log line and writes its own export
+class Report:
+    name = "Report"
+    mergeable = False  # True if partial copies filled by workers can be merged back
+    persistent = False  # True if the totals can be saved between incremental runs
+
+    # Lines the report needs, used to skip the rest before parsing (None means any)
+    status = None
+    method = None
+    path_contains = None
+
+    # Checks in add() that skip lines, in order; the lines each one skipped are counted in filter_counts
+    filters = ()
+    path_filter = None  # The filter that skips the lines without path_contains, for the run stats
+
+    def __init__(self, export_path):
+        self.export_path = export_path
+        self.filter_counts = dict.fromkeys(self.filters, 0)
+        self.clear()
+
+    # Resets the collected data, keeping the configuration
+    def clear(self):
+        pass
+
+    # Returns a copy with the same configuration and no data, for a worker to fill in
+    def empty_copy(self):
+        partial = copy.copy(self)
+        partial.filter_counts = dict.fromkeys(self.filters, 0)
+        partial.clear()
+        return partial
+
+    # Adds the data collected by a partial copy into this report
+    # The partial must be left as it was and none of its containers kept, since live mode merges each bucket again
+    # on every snapshot
+    def merge(self, partial):
+        raise NotImplementedError
+
+    # Settings that change the totals; saved totals are only reused while these stay the same
+    def config_key(self):
+        return (self.name,)
+
+    # Called once before the first line is read
+    def start(self):
+        pass
+
+    # Called in the worker process before an empty copy is filled
+    def start_partial(self):
+        pass
+
+    # Called in the worker process after an empty copy is filled, before it's sent back
+    def finish_partial(self):
+        pass
+
+    # Called once per parsed log line
+    def add(self, log_data):
+        raise NotImplementedError
+
+    # Called with a column batch of parsed lines (field -> list of values, in log order) when logs are
+    # parsed a block at a time. Reports can override it to work on whole columns; by default each line is added
+    def add_batch(self, batch):
+        for values in zip(*batch.values()):
+            self.add(dict(zip(batch, values)))
+
+    # Called once after the last line is read
+    def export(self):
+        raise NotImplementedError
+
+# Report: hits and unique subpages per folder at a given depth (tier1/2/3 drilldowns)
+class FolderSummaryReport(Report):
+    name = "Folder summary"
+    mergeable = True
+    persistent = True
+    status = 200
+    method = 'GET'
+    filters = ('status', 'method', 'bot', 'url_exception', 'no_folder')
+
+    # Set subpage_error (e.g., 0.01 for about 1%) to estimate total_subpages with fixed memory per folder
+    def __init__(self, depth, export_path, bot_list, url_exceptions, subpage_error=None):
+        self.depth = depth
+        self.bot_matcher = PatternMatcher(bot_list, ignore_case=True)
+        self.url_exception_matcher = PatternMatcher(url_exceptions)
+        self.subpage_error = subpage_error
+        super().__init__(export_path)
+
+    def clear(self):
+        self.folder_hits = defaultdict(int)  # Track total hits per folder
+        self.folder_pages = {}  # Track unique subpages per folder
+
+    # Function to create the unique subpage tracker for a new folder
+    def new_page_set(self):
+        if self.subpage_error:
+            return HyperLogLog(self.subpage_error)
+        return set()
+
+    def add(self, log_data):
+        if log_data['status_code'] != 200:
+            self.filter_counts['status'] += 1
+            return
+        if log_data['method'] != 'GET':
+            self.filter_counts['method'] += 1
+            return
+
+        # Skip if user-agent matches any bot in the list
+        if self.bot_matcher.matches(log_data['user_agent']):
+            self.filter_counts['bot'] += 1
+            return
+
+        self.add_path(log_data['request_path'])
+
+    # Filters whole columns, then handles each distinct path once with its number of hits
+    def add_batch(self, batch):
+        statuses = batch['status_code']
+        ok_count = statuses.count(200)
+        self.filter_counts['status'] += len(statuses) - ok_count
+        requests = [(user_agent, path) for status, method, user_agent, path
+                    in zip(statuses, batch['method'], batch['user_agent'], batch['request_path'])
+                    if status == 200 and method == 'GET']
+        self.filter_counts['method'] += ok_count - len(requests)
+
+        # Skip if user-agent matches any bot in the list, checking each distinct user agent once
+        bots = {user_agent for user_agent in {user_agent for user_agent, path in requests} if self.bot_matcher.matches(user_agent)}
+        paths = [path for user_agent, path in requests if user_agent not in bots]
+        self.filter_counts['bot'] += len(requests) - len(paths)
+
+        for path, hits in Counter(paths).items():  # Counter keeps the order paths were first seen
+            self.add_path(path, hits)
+
+    # Counts `hits` hits of a request path from a (non-bot) 200 GET request
+    def add_path(self, request_path, hits=1):
+        # Skip URLs that match any of the exclusion patterns
+        if self.url_exception_matcher.matches(request_path):
+            self.filter_counts['url_exception'] += hits
+            return
+
+        folder = extract_folder(request_path, self.depth)
+        if not folder:
+            self.filter_counts['no_folder'] += hits  # Path isn't this many folders deep
+            return
+
+        # Strip query parameters from the request path for unique subpage counting
+        clean_path = urlparse(request_path).path  # Ignore the query string
+
+        self.folder_hits[folder] += hits  # Count the hits for this folder
+        pages = self.folder_pages.get(folder)
+        if pages is None:
+            pages = self.folder_pages[folder] = self.new_page_set()
+        pages.add(clean_path)  # Track unique subpages, ignoring query params
+
+    def merge(self, partial):
+        for folder, hits in partial.folder_hits.items():
+            self.folder_hits[folder] += hits
+            pages = self.folder_pages.get(folder)
+            if pages is None:
+                pages = self.folder_pages[folder] = self.new_page_set()
+            pages |= partial.folder_pages[folder]
+
+    def config_key(self):
+        return (self.name, self.depth, self.bot_matcher.patterns, self.url_exception_matcher.patterns, self.subpage_error)
+
+    def export(self):
+        with open(self.export_path, 'w', newline='') as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(['folder', 'total_subpages', 'total_hits'])  # Write header
+
+            for folder, hits in self.folder_hits.items():
+                total_subpages = len(self.folder_pages[folder])  # Count unique subpages
+                csv_writer.writerow([folder, total_subpages, hits])  # Write folder data
+
+# Report: site search terms and their counts
+class SearchTermsReport(Report):
+    name = "Search terms"
+    mergeable = True
+    persistent = True
+    status = 200
+    method = 'GET'
+    filters = ('status', 'method', 'no_search_term')
+    path_filter = 'no_search_term'
+
+    # Set top_k (e.g., 1000) to only keep the most frequent terms, in fixed memory, with an error column
+    def __init__(self, export_path, search_url_path, search_param, top_k=None):
+        self.search_url_path = search_url_path
+        self.search_param = search_param
+        self.path_contains = search_url_path
+        self.top_k = top_k
+        super().__init__(export_path)
+
+    def clear(self):
+        if self.top_k:
+            # Extra room makes the counts of the top K terms much tighter
+            self.search_terms = SpaceSaving(self.top_k * 4)
+        else:
+            self.search_terms = {}  # Dictionary to store search term counts
+
+    def add(self, log_data):
+        if log_data['status_code'] != 200:
+            self.filter_counts['status'] += 1
+            return
+        if log_data['method'] != 'GET':
+            self.filter_counts['method'] += 1
+            return
+
+        self.add_term(extract_search_term(log_data['request_path'], self.search_url_path, self.search_param))
+
+    # Filters whole columns, then extracts the search term of each distinct path once
+    def add_batch(self, batch):
+        statuses = batch['status_code']
+        ok_count = statuses.count(200)
+        self.filter_counts['status'] += len(statuses) - ok_count
+        paths = [path for status, method, path in zip(statuses, batch['method'], batch['request_path'])
+                 if status == 200 and method == 'GET']
+        self.filter_counts['method'] += ok_count - len(paths)
+
+        if self.top_k:
+            # The top-K summary depends on the order terms arrive in, so add them line by line
+            search_terms = {path: extract_search_term(path, self.search_url_path, self.search_param) for path in set(paths)}
+            for path in paths:
+                self.add_term(search_terms[path])
+            return
+        for path, hits in Counter(paths).items():  # Counter keeps the order paths were first seen
+            self.add_term(extract_search_term(path, self.search_url_path, self.search_param), hits)
+
+    # Counts a search term `hits` times (or `hits` lines without one)
+    def add_term(self, search_term, hits=1):
+        if not search_term:
+            self.filter_counts['no_search_term'] += hits
+        elif self.top_k:
+            for _ in range(hits):
+                self.search_terms.add(search_term)
+        elif search_term in self.search_terms:
+            self.search_terms[search_term] += hits
+        else:
+            self.search_terms[search_term] = hits
+
+    def merge(self, partial):
+        if self.top_k:
+            self.search_terms |= partial.search_terms
+            return
+        for search_term, count in partial.search_terms.items():
+            self.search_terms[search_term] = self.search_terms.get(search_term, 0) + count
+
+    def config_key(self):
+        return (self.name, self.search_url_path, self.search_param, self.top_k)
+
+    def export(self):
+        if self.top_k:
+            with open(self.export_path, 'w', newline='') as csv_file:
+                csv_writer = csv.writer(csv_file)
+                csv_writer.writerow(['search_term', 'count', 'count_error'])  # Count may be too high by up to count_error
+                csv_writer.writerows(self.search_terms.most_common(self.top_k))
+            return
+
+        sorted_terms = sorted(self.search_terms.items(), key=lambda x: x[1], reverse=True)  # Sort by count, descending
+
+        with open(self.export_path, 'w', newline='') as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(['search_term', 'count'])  # Write header
+            csv_writer.writerows(sorted_terms)  # Write search terms and counts
+
+# Base for reports that write every parsed log line to a file
+# Rows are buffered and written export_batch_size at a time instead of one call per line. Workers write
+# their rows to a part file next to the export, and merge appends the parts in file order
+class BatchExportReport(Report):
+    mergeable = True
+    part_suffix = '.part'
+
+    def clear(self):
+        self.rows = []
+        self.part_path = None  # Temporary file a worker writes its rows to
+
+    def start(self):
+        self.open(self.export_path, header=True)
+
+    def start_partial(self):
+        part_dir = os.path.dirname(os.path.abspath(self.export_path))
+        part_fd, self.part_path = tempfile.mkstemp(suffix=self.part_suffix, dir=part_dir)
+        os.close(part_fd)
+        self.open(self.part_path, header=False)
+
+    def finish_partial(self):
+        self.flush()
+        self.close()
+
+    def add(self, log_data):
+        self.rows.append([
+            log_data['ip_address'],
+            parse_timestamp(log_data['timestamp']),
+            log_data['status_code'],
+            log_data['method'],
+            log_data['request_path'],
+            log_data['response_size'],
+            log_data['user_agent'],
+        ])
+        if len(self.rows) >= export_batch_size:
+            self.flush()
+
+    def add_batch(self, batch):
+        self.rows.extend(zip(
+            batch['ip_address'],
+            map(parse_timestamp, batch['timestamp']),
+            batch['status_code'],
+            batch['method'],
+            batch['request_path'],
+            batch['response_size'],
+            batch['user_agent'],
+        ))
+        if len(self.rows) >= export_batch_size:
+            self.flush()
+
+    # Writes the buffered rows
+    def flush(self):
+        if self.rows:
+            self.write_rows(self.rows)
+            self.rows = []
+
+    def merge(self, partial):
+        self.flush()
+        self.append_part(partial.part_path)
+        os.remove(partial.part_path)
+
+    def export(self):
+        self.flush()
+        self.close()
+
+    # Opens the export (or a worker's part file) for writing
+    def open(self, path, header):
+        raise NotImplementedError
+
+    # Writes a batch of rows, each a list or tuple of values in log_fields order
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    # Appends the rows of a worker's part file
+    def append_part(self, part_path):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+# Function to open a text stream for CSV rows on a binary file, gzip or zstd compressed if asked
+def open_export_stream(raw_file, compression=None):
+    if compression == 'gzip':
+        stream = gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=6)  # Level 6, like the gzip command
+    elif compression == 'zstd':
+        import zstandard  # Only needed for .zst exports (pip install zstandard)
+        stream = zstandard.ZstdCompressor().stream_writer(raw_file, closefd=False)
+    else:
+        stream = raw_file
+    return io.TextIOWrapper(stream, newline='')
+
+# Function to finish a stream from open_export_stream, leaving the binary file open
+def close_export_stream(text_file, raw_file):
+    text_file.flush()
+    stream = text_file.detach()
+    if stream is not raw_file:
+        stream.close()  # Writes the gzip trailer or the end of the zstd frame
+
+# Report: every parsed log line as a CSV row
+# An export_path ending in .gz or .zst writes gzip or zstd compressed CSV
+class CsvExportReport(BatchExportReport):
+    name = "CSV export"
+
+    def __init__(self, export_path):
+        if export_path.endswith('.gz'):
+            self.compression = 'gzip'
+        elif export_path.endswith('.zst'):
+            self.compression = 'zstd'
+        else:
+            self.compression = None
+        super().__init__(export_path)
+
+    def clear(self):
+        super().clear()
+        self.raw_file = None
+        self.text_file = None
+        self.csv_writer = None
+
+    def open(self, path, header):
+        self.raw_file = open(path, 'wb')
+        if header:
+            self.write_rows([log_fields])  # Write header
+
+    def write_rows(self, rows):
+        if self.text_file is None:
+            self.text_file = open_export_stream(self.raw_file, self.compression)
+            self.csv_writer = csv.writer(self.text_file)
+        self.csv_writer.writerows(rows)
+
+    # Finishes the current compressed stream, so raw bytes can follow it
+    def end_stream(self):
+        if self.text_file is not None:
+            close_export_stream(self.text_file, self.raw_file)
+            self.text_file = None
+            self.csv_writer = None
+
+    # Compressed parts are complete gzip members or zstd frames, which are still valid one after another
+    def append_part(self, part_path):
+        self.end_stream()
+        with open(part_path, 'rb') as part_file:
+            shutil.copyfileobj(part_file, self.raw_file)
+
+    def close(self):
+        self.end_stream()
+        self.raw_file.close()
+        self.raw_file = None
+
+# Function to get the Parquet columns of an export, with timestamps in UTC
+def parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('ip_address', pa.string()),
+        ('timestamp', pa.timestamp('s', tz='UTC')),
+        ('status_code', pa.int32()),
+        ('method', pa.string()),
+        ('request_path', pa.string()),
+        ('response_size', pa.int64()),
+        ('user_agent', pa.string()),
+    ])
+
+# Report: every parsed log line as a Parquet row, one row group per export_batch_size rows
+# Needs pyarrow (pip install pyarrow). Repeated values like user agents are dictionary-encoded
+class ParquetExportReport(BatchExportReport):
+    name = "Parquet export"
+    part_suffix = '.parquet.part'
+
+    def clear(self):
+        super().clear()
+        self.parquet_writer = None
+
+    def open(self, path, header):
+        import pyarrow.parquet as pq  # Only this report needs pyarrow
+
+        self.parquet_writer = pq.ParquetWriter(path, parquet_schema(), compression='snappy')
+
+    def write_rows(self, rows):
+        import pyarrow as pa
+
+        schema = parquet_schema()
+        columns = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+        self.parquet_writer.write_table(pa.Table.from_arrays(columns, schema=schema), row_group_size=export_batch_size)
+
+    def append_part(self, part_path):
+        import pyarrow.parquet as pq
+
+        with open(part_path, 'rb') as part_file:
+            part = pq.ParquetFile(part_file)
+            for row_group in range(part.num_row_groups):
+                self.parquet_writer.write_table(part.read_row_group(row_group))
+
+    def close(self):
+        self.parquet_writer.close()
+        self.parquet_writer = None
+
+# Report: every parsed log line as a row of an SQLite table
+# Each batch is inserted with one executemany call in one transaction
+class SqliteExportReport(BatchExportReport):
+    name = "SQLite export"
+    part_suffix = '.sqlite.part'
+
+    def __init__(self, export_path, table='log_lines'):
+        self.table = table
+        super().__init__(export_path)
+
+    def clear(self):
+        super().clear()
+        self.connection = None
+
+    def open(self, path, header):
+        if os.path.exists(path):
+            os.remove(path)  # Start a new database each run, like the CSV export
+        self.connection = sqlite3.connect(path)
+        # The database is rebuilt from the logs on every run, so skip the journal and disk syncs
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(f'CREATE TABLE "{self.table}" (ip_address TEXT, timestamp TEXT, status_code INTEGER, '
+                                'method TEXT, request_path TEXT, response_size INTEGER, user_agent TEXT)')
+
+    def write_rows(self, rows):
+        with self.connection:  # One transaction per batch
+            self.connection.executemany(
+                f'INSERT INTO "{self.table}" VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((ip, str(timestamp), status, method, path, size, user_agent)  # Timestamps as written in the CSV
+                 for ip, timestamp, status, method, path, size, user_agent in rows))
+
+    def append_part(self, part_path):
+        self.connection.execute('ATTACH DATABASE ? AS part', (part_path,))
+        with self.connection:
+            self.connection.execute(f'INSERT INTO "{self.table}" SELECT * FROM part."{self.table}" ORDER BY rowid')
+        self.connection.execute('DETACH DATABASE part')
+
+    def close(self):
+        self.connection.close()
+        self.connection = None
+
+# Compact copy of a parsed log line, for state that holds many lines at once (like visits waiting in a
+# SessionTable) instead of a dict per line. Slots take a fraction of a dict's memory, and the method, path
+# and user agent are interned. Fields read like the log_data dict too: record['request_path']
+class LogRecord:
+    __slots__ = tuple(log_fields)
+
+    def __init__(self, log_data):
+        self.ip_address = log_data['ip_address']
+        self.timestamp = log_data['timestamp']
+        self.status_code = log_data['status_code']
+        self.method = intern_value('method', log_data['method'])
+        self.request_path = intern_value('request_path', log_data['request_path'])
+        self.response_size = log_data['response_size']
+        self.user_agent = intern_value('user_agent', log_data['user_agent'])
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    # Returns the values in log_fields order, e.g. for a CSV row
+    def values(self):
+        return [getattr(self, field) for field in log_fields]
+
+# Visits waiting for the visitor's next request, keyed by IP (or IP and user agent)
+# A visit with no request for `timeout` seconds of log time is expired, so memory stays bounded and
+# an old visit can't pick up an unrelated request weeks later. Timeout None keeps visits forever
+class SessionTable:
+    def __init__(self, timeout, key_user_agent=False):
+        self.timeout = timeout
+        self.key_user_agent = key_user_agent
+        self.sessions = OrderedDict()  # Key -> (last_seen, value), least recently active first
+
+    # Function to get the session key of a log line
+    def key(self, log_data):
+        if self.key_user_agent:
+            return (log_data['ip_address'], log_data['user_agent'])
+        return log_data['ip_address']
+
+    def put(self, key, now, value):
+        if self.key_user_agent:
+            key = (key[0], intern_value('user_agent', key[1]))  # Many visitors share a user agent
+        self.sessions[key] = (now, value)
+        self.sessions.move_to_end(key)
+
+    # Removes a session and returns its value (None if there isn't one)
+    def pop(self, key):
+        session = self.sessions.pop(key, None)
+        return session[1] if session else None
+
+    # Removes and returns the values of sessions inactive for longer than the timeout at time `now`
+    def expire(self, now):
+        expired = []
+        if self.timeout is None:
+            return expired
+        while self.sessions:
+            key, (last_seen, value) = next(iter(self.sessions.items()))
+            if now - last_seen <= self.timeout:
+                break
+            del self.sessions[key]
+            expired.append(value)
+        return expired
+
+    # Removes and returns the values of all remaining sessions
+    def expire_all(self):
+        values = [value for last_seen, value in self.sessions.values()]
+        self.sessions.clear()
+        return values
+
+# A visit to filter_path waiting for the visitor's next request
+class ExitVisit(LogRecord):
+    __slots__ = ('next_url',)
+
+    def __init__(self, log_data, timestamp):
+        super().__init__(log_data)
+        self.timestamp = timestamp  # Parsed, as written to the CSV
+        self.next_url = None
+
+    # Returns the CSV row of the visit
+    def row(self):
+        return self.values() + [self.next_url]
+
+# Report: visits to filter_path with the next URL requested by the same visitor ("exit pages")
+# Visits with no next request within session_timeout seconds are written as exits (empty next_url)
+class ExitPagesReport(Report):
+    name = "Exit pages"
+    status = 200
+    method = 'GET'
+    filters = ('status', 'method')
+
+    def __init__(self, export_path, filter_path, session_timeout=1800, session_key_user_agent=False):
+        self.filter_path = filter_path
+        self.session_timeout = session_timeout
+        self.session_key_user_agent = session_key_user_agent
+        super().__init__(export_path)
+
+    def clear(self):
+        self.sessions = SessionTable(self.session_timeout, self.session_key_user_agent)  # Visits waiting for a next URL
+
+    def start(self):
+        self.csv_file = open(self.export_path, 'w', newline='')
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(log_fields + ['next_url'])
+
+    def add(self, log_data):
+        # Only process logs with status code 200 and full page requests
+        if log_data['status_code'] != 200:
+            self.filter_counts['status'] += 1
+        elif log_data['method'] != 'GET':
+            self.filter_counts['method'] += 1
+        else:
+            timestamp = parse_timestamp(log_data['timestamp'])
+
+            # Write visits that timed out as exits
+            for visit in self.sessions.expire(timestamp.timestamp()):
+                self.csv_writer.writerow(visit.row())
+
+            # Check if this visitor has a visit to filter_path waiting for its next URL
+            key = self.sessions.key(log_data)
+            visit = self.sessions.pop(key)
+            if visit is not None:
+                # Assign the current request path and write the previous visit to the CSV
+                visit.next_url = log_data['request_path']
+                self.csv_writer.writerow(visit.row())
+
+            # If the current log entry is for filter_path, store it for later processing
+            if log_data['request_path'] == self.filter_path:
+                self.sessions.put(key, timestamp.timestamp(), ExitVisit(log_data, timestamp))
+
+    def export(self):
+        # Visits still waiting when the logs end are exits too
+        for visit in self.sessions.expire_all():
+            self.csv_writer.writerow(visit.row())
+        self.csv_file.close()
+
+# Report: next URL "CTR" summary for visits to filter_path
+# Visits with no next request within session_timeout seconds are counted as exits
+class PageCtrReport(Report):
+    name = "Page CTR summary"
+    status = 200
+    filters = ('status',)
+
+    def __init__(self, export_path, filter_path, session_timeout=1800, session_key_user_agent=False):
+        self.filter_path = filter_path
+        self.session_timeout = session_timeout
+        self.session_key_user_agent = session_key_user_agent
+        super().__init__(export_path)
+
+    def clear(self):
+        self.sessions = SessionTable(self.session_timeout, self.session_key_user_agent)  # Visit timestamps waiting for a next URL
+        self.next_url_counts = defaultdict(int)
+        self.exits = 0
+        self.min_timestamp = None
+        self.max_timestamp = None
+
+    def add(self, log_data):
+        if log_data['status_code'] != 200:
+            self.filter_counts['status'] += 1
+        else:
+            timestamp = parse_timestamp(log_data['timestamp'])
+            self.exits += len(self.sessions.expire(timestamp.timestamp()))
+            key = self.sessions.key(log_data)
+
+            # If the current log entry is for the filter_path, store it
+            if log_data['request_path'] == self.filter_path:
+                self.sessions.put(key, timestamp.timestamp(), timestamp)
+                return
+
+            # If this is a subsequent request from the same visitor, count it as the next URL
+            visit_timestamp = self.sessions.pop(key)
+            if visit_timestamp is not None:
+                self.next_url_counts[log_data['request_path']] += 1
+                if self.min_timestamp is None or visit_timestamp < self.min_timestamp:
+                    self.min_timestamp = visit_timestamp
+                if self.max_timestamp is None or visit_timestamp > self.max_timestamp:
+                    self.max_timestamp = visit_timestamp
+
+    def export(self):
+        import pandas as pd  # Only this report needs pandas
+
+        # Visits still waiting when the logs end are exits too
+        self.exits += len(self.sessions.expire_all())
+
+        # 1. Calculate total hits
+        total_hits = sum(self.next_url_counts.values())
+
+        # 2. Unique next_url counts, most common first
+        sorted_counts = sorted(self.next_url_counts.items(), key=lambda x: x[1], reverse=True)
+        next_url_counts = pd.DataFrame(sorted_counts, columns=['next_url', 'count'])
+
+        # 3. Add percentage of total hits
+        next_url_counts['percent_of_total'] = (next_url_counts['count'] / total_hits) * 100
+
+        # 4. Date range of the counted visits
+        min_timestamp = self.min_timestamp
+        max_timestamp = self.max_timestamp
+
+        # Display meta metrics
+        print(f"Total Hits: {total_hits}")
+        print(f"Exits: {self.exits}")
+        print(f"Date Range: {min_timestamp} to {max_timestamp}")
+
+        # Create a dataframe for meta information
+        meta_info = pd.DataFrame({
+            'Metric': ['Total Hits', 'Exits', 'Date Range'],
+            'Value': [total_hits, self.exits, f"{min_timestamp} to {max_timestamp}"]
+        })
+
+        # Write meta information and summary to CSV
+        with open(self.export_path, 'w') as f:
+            meta_info.to_csv(f, header=False, index=False)
+
+            # Write an empty row after meta information
+            f.write('\n')
+
+            # Append the next_url summary
+            next_url_counts.to_csv(f, index=False)
+
+# Counters for a run: bytes and lines through each stage, time per stage, the lines each report's
+# filters skipped, and examples of lines log_pattern didn't match. Workers fill their own and merge them back
+# Stage times are measured per block when blocks are parsed as batches, and otherwise on one line in
+# stats_sample_every, scaled up to all the lines of that stage. With workers they add up the time of every
+# process. Reading and decompressing runs in its own thread
+# Guards the read counters, which the read-ahead thread and the main thread (cached archives) both add to
+stats_read_lock = Lock()
+
+class RunStats:
+    def __init__(self, reports, bytes_total=None, show_progress=True):
+        self.reports = [{'name': report.name, 'export_path': report.export_path, 'filters': report.filters} for report in reports]
+        self.started = time.time()
+        self.next_progress = time.monotonic() + progress_interval if progress_interval and show_progress else None
+        self.files = 0  # Log files in the run
+        self.bytes_total = bytes_total  # Size of the log files on disk, for the ETA (None if unknown)
+        self.bytes_read = 0  # Log file bytes read from disk
+        self.bytes_decompressed = 0
+        self.read_seconds = 0.0
+        self.lines_read = 0
+        self.lines_prefiltered = 0  # Skipped by the substring check before parsing
+        self.lines_unmatched = 0
+        self.unmatched_samples = []
+        self.filter_counts = [dict.fromkeys(report.filters, 0) for report in reports]
+
+        # Prefiltered lines are never parsed, so one in stats_sample_every of them is, to estimate how many
+        # wouldn't have matched log_pattern and which report filter each one stands in for
+        self.report_needs = [(report.status, report.method, report.path_contains, report.path_filter) for report in reports]
+        self.prefilter_samples = 0
+        self.prefilter_sample_unmatched = 0
+        self.prefilter_sample_counts = [dict.fromkeys(report.filters, 0) for report in reports]
+        self.prefilter_sample_offset = stats_sample_every - 1  # Index of the next sampled line in a block
+
+        # Timed lines and their time in each stage
+        self.sampled = {'prefilter': 0, 'parse': 0, 'reports': 0}
+        self.sample_seconds = {'prefilter': 0.0, 'parse': 0.0}
+        self.report_sample_seconds = [0.0] * len(reports)
+
+    # Function to count the lines going through, taking one in stats_sample_every to time its stages
+    def sample_lines(self, lines, line_filter, reports, encoding):
+        countdown = stats_sample_every
+        for line in lines:
+            countdown -= 1
+            if countdown:
+                yield line
+                continue
+            countdown = stats_sample_every
+            self.lines_read += stats_sample_every
+            self.time_line(line, line_filter, reports, encoding)
+            if self.next_progress is not None and time.monotonic() >= self.next_progress:
+                self.print_progress()
+        self.lines_read += stats_sample_every - countdown
+
+    # Function to process one line like process_log_lines does, timing each stage
+    def time_line(self, line, line_filter, reports, encoding):
+        started = time.perf_counter()
+        passed = not line_filter or line_filter(line)
+        filtered = time.perf_counter()
+        self.sampled['prefilter'] += 1
+        self.sample_seconds['prefilter'] += filtered - started
+        if not passed:
+            self.lines_prefiltered += 1
+            self.add_prefiltered_sample(parse_log_line(line.decode(encoding) if encoding else line), line)
+            return
+
+        if encoding:
+            line = line.decode(encoding)
+        log_data = parse_log_line(line)
+        parsed = time.perf_counter()
+        self.sampled['parse'] += 1
+        self.sample_seconds['parse'] += parsed - filtered
+        if not log_data:
+            self.add_unmatched(line)
+            return
+
+        self.sampled['reports'] += 1
+        for index, report in enumerate(reports):
+            report.add(log_data)
+            added = time.perf_counter()
+            self.report_sample_seconds[index] += added - parsed
+            parsed = added
+
+    # Function to add the counts and times of a block parsed as a batch
+    # Leave out report_seconds when the batch reaches the reports later (see add_report_seconds)
+    def add_block(self, lines, lines_passed, lines_parsed, filter_seconds, parse_seconds, report_seconds=None):
+        self.lines_read += lines
+        self.lines_prefiltered += lines - lines_passed
+        self.sampled['prefilter'] += lines
+        self.sample_seconds['prefilter'] += filter_seconds
+        self.sampled['parse'] += lines_passed
+        self.sample_seconds['parse'] += parse_seconds
+        self.sampled['reports'] += lines_parsed
+        if report_seconds:
+            self.add_report_seconds(report_seconds)
+        if self.next_progress is not None and time.monotonic() >= self.next_progress:
+            self.print_progress()
+
+    # Function to add the seconds each report took on a batch
+    def add_report_seconds(self, report_seconds):
+        self.report_sample_seconds = [seconds + batch_seconds for seconds, batch_seconds in zip(self.report_sample_seconds, report_seconds)]
+
+    # Function to check one in stats_sample_every lines of a block, sampling the ones the prefilter skipped
+    def sample_prefiltered_lines(self, lines, tokens, encoding):
+        for line in lines[self.prefilter_sample_offset::stats_sample_every]:
+            if not all(token in line for token in tokens):
+                text = line.decode(encoding)
+                self.add_prefiltered_sample(parse_log_line(text), text)
+        self.prefilter_sample_offset = (self.prefilter_sample_offset - len(lines)) % stats_sample_every
+
+    # Function to count a sampled line the prefilter skipped: as unmatched if it has no log_data, otherwise
+    # under the first filter of each report that would have skipped it
+    def add_prefiltered_sample(self, log_data, line=None):
+        self.prefilter_samples += 1
+        if log_data is None:
+            self.prefilter_sample_unmatched += 1
+            if line is not None:
+                self.add_unmatched_sample(line)
+            return
+        for counts, (status, method, path_contains, path_filter) in zip(self.prefilter_sample_counts, self.report_needs):
+            if status is not None and log_data['status_code'] != status:
+                counts['status'] += 1
+            elif method is not None and log_data['method'] != method:
+                counts['method'] += 1
+            elif path_contains and path_contains not in log_data['request_path'] and path_filter:
+                counts[path_filter] += 1
+
+    # Function to estimate the prefiltered lines that didn't match log_pattern, and the lines each report's
+    # filters would have skipped among the prefiltered ones, from the sampled lines
+    def prefilter_estimates(self):
+        scale = self.lines_prefiltered / self.prefilter_samples if self.prefilter_samples else 0.0
+        unmatched = round(self.prefilter_sample_unmatched * scale)
+        filter_counts = [{name: round(count * scale) for name, count in counts.items()} for counts in self.prefilter_sample_counts]
+        return unmatched, filter_counts
+
+    # Function to get every line that didn't match log_pattern, with the estimate for prefiltered lines
+    def lines_unmatched_total(self):
+        return self.lines_unmatched + self.prefilter_estimates()[0]
+
+    # Function to count the lines of a batch that didn't match, finding examples while there's room for them
+    def add_unmatched_lines(self, lines, count, encoding):
+        for line in lines:
+            if len(self.unmatched_samples) >= stats_unmatched_samples or not count:
+                break
+            if parse_log_line(line.decode(encoding)) is None:
+                self.add_unmatched(line)
+                count -= 1
+        self.lines_unmatched += count
+
+    def add_unmatched(self, line):
+        self.lines_unmatched += 1
+        self.add_unmatched_sample(line)
+
+    def add_unmatched_sample(self, line):
+        if len(self.unmatched_samples) < stats_unmatched_samples:
+            if isinstance(line, bytes):
+                line = line.decode(log_encoding, errors='replace')
+            self.unmatched_samples.append(line.rstrip('\r\n')[:1000])
+
+    # Function to add bytes read from disk, bytes decompressed and time spent reading, from any thread
+    def add_read(self, bytes_read=0, bytes_decompressed=0, seconds=0.0):
+        with stats_read_lock:
+            self.bytes_read += bytes_read
+            self.bytes_decompressed += bytes_decompressed
+            self.read_seconds += seconds
+
+    # Function to add the lines each report's filters skipped, then reset the reports' counts
+    def add_report_filters(self, reports):
+        for counts, report in zip(self.filter_counts, reports):
+            for name, count in report.filter_counts.items():
+                counts[name] += count
+            report.filter_counts = dict.fromkeys(report.filters, 0)
+
+    # Function to add the counters of a worker's stats
+    def merge(self, partial):
+        for name in ['bytes_read', 'bytes_decompressed', 'read_seconds', 'lines_read', 'lines_prefiltered', 'lines_unmatched']:
+            setattr(self, name, getattr(self, name) + getattr(partial, name))
+        self.unmatched_samples += partial.unmatched_samples[:stats_unmatched_samples - len(self.unmatched_samples)]
+        for counts, partial_counts in zip(self.filter_counts + self.prefilter_sample_counts,
+                                          partial.filter_counts + partial.prefilter_sample_counts):
+            for name, count in partial_counts.items():
+                counts[name] += count
+        self.prefilter_samples += partial.prefilter_samples
+        self.prefilter_sample_unmatched += partial.prefilter_sample_unmatched
+        for stage in self.sampled:
+            self.sampled[stage] += partial.sampled[stage]
+        for stage in self.sample_seconds:
+            self.sample_seconds[stage] += partial.sample_seconds[stage]
+        self.report_sample_seconds = [seconds + partial_seconds for seconds, partial_seconds
+                                      in zip(self.report_sample_seconds, partial.report_sample_seconds)]
+        if self.next_progress is not None and time.monotonic() >= self.next_progress:
+            self.print_progress()
+
+    @property
+    def lines_parsed(self):
+        return self.lines_read - self.lines_prefiltered - self.lines_unmatched
+
+    # Function to scale the time of the sampled lines up to every line of a stage
+    def estimate_seconds(self, sampled, seconds, lines):
+        return seconds / sampled * lines if sampled else 0.0
+
+    def print_progress(self):
+        self.next_progress = time.monotonic() + progress_interval
+        elapsed = time.time() - self.started
+        progress = f"  {self.lines_read:,} lines"
+        if self.bytes_read:
+            progress += f", {self.bytes_read / 1e6:,.0f} MB read at {self.bytes_read / 1e6 / elapsed:,.1f} MB/s"
+        if self.bytes_total and self.bytes_read:
+            remaining = elapsed * (self.bytes_total - self.bytes_read) / self.bytes_read
+            progress += f", {self.bytes_read / self.bytes_total:.0%} done, about {timedelta(seconds=round(remaining))} left"
+        print(progress)
+
+    # Function to write the stats to a JSON file
+    def export(self, stats_path):
+        elapsed = time.time() - self.started
+        lines_passed = self.lines_read - self.lines_prefiltered
+        prefilter_unmatched, prefilter_counts = self.prefilter_estimates()
+        reports = []
+        for index, report in enumerate(self.reports):
+            filters = {}
+            # Every parsed line goes to every report, and prefiltered lines count under the filters they stand in for
+            lines = self.lines_parsed + sum(prefilter_counts[index].values())
+            for name in report['filters']:
+                filters[name] = {'in': lines, 'out': lines - self.filter_counts[index][name] - prefilter_counts[index][name]}
+                lines = filters[name]['out']
+            reports.append(dict(report, filters=filters, seconds=self.estimate_seconds(
+                self.sampled['reports'], self.report_sample_seconds[index], self.lines_parsed)))
+
+        stats = {
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'elapsed_seconds': round(elapsed, 3),
+            'files': self.files,
+            'bytes_read': self.bytes_read,
+            'bytes_decompressed': self.bytes_decompressed,
+            'bytes_per_second': round(self.bytes_read / elapsed) if elapsed else None,
+            'lines_per_second': round(self.lines_read / elapsed) if elapsed else None,
+            'stages': {
+                'read': {'seconds': self.read_seconds, 'bytes_in': self.bytes_read, 'bytes_out': self.bytes_decompressed},
+                'prefilter': {'seconds': self.estimate_seconds(self.sampled['prefilter'], self.sample_seconds['prefilter'], self.lines_read),
+                              'lines_in': self.lines_read, 'lines_out': lines_passed},
+                'parse': {'seconds': self.estimate_seconds(self.sampled['parse'], self.sample_seconds['parse'], lines_passed),
+                          'lines_in': lines_passed, 'lines_out': self.lines_parsed},
+            },
+            'reports': reports,
+            'unmatched_lines': self.lines_unmatched + prefilter_unmatched,
+            'unmatched_lines_prefiltered': prefilter_unmatched,  # Estimated from the sampled prefiltered lines
+            'unmatched_samples': self.unmatched_samples,
+            'stats_sample_every': stats_sample_every,
+        }
+        with open(stats_path, 'w') as stats_file:
+            json.dump(stats, stats_file, indent=2)
+
+# Function to send each parsed log line to all reports
+# Lines can be bytes with an encoding, in which case only lines passing the filter are decoded
+# Pass stats to count the lines through each stage (see RunStats)
+def process_log_lines(lines, reports, encoding=None, stats=None):
+    line_filter = make_reports_line_filter(reports, as_bytes=encoding is not None)
+    if stats:
+        lines = stats.sample_lines(lines, line_filter, reports, encoding)
+    prefiltered = 0
+    for line in lines:
+        if line_filter and not line_filter(line):
+            prefiltered += 1
+            continue
+        if encoding:
+            line = line.decode(encoding)
+        log_data = parse_log_line(line)
+        if log_data:  # Check if log_data is not None
+            for report in reports:
+                report.add(log_data)
+        elif stats:
+            stats.add_unmatched(line)
+    if stats:
+        stats.lines_prefiltered += prefiltered
+
+# Function to parse blocks of log bytes as column batches and send each batch to all reports
+def process_log_blocks(blocks, reports, encoding, stats=None):
+    tokens = line_filter_tokens(*shared_report_needs(reports), as_bytes=True)
+    for batch, line_count, kept_count, filter_seconds, parse_seconds in parse_log_blocks(blocks, tokens, encoding, stats):
+        report_seconds = add_batch_to_reports(batch, reports)
+        if stats:
+            stats.add_block(line_count, kept_count, len(batch['status_code']), filter_seconds, parse_seconds, report_seconds)
+
+# Function to parse blocks of log bytes as column batches, yielding (batch, lines, lines passing the prefilter,
+# prefilter seconds, parse seconds) for each one
+# Blocks are cut at their last newline, so every batch holds whole lines
+def parse_log_blocks(blocks, tokens, encoding, stats=None):
+    tail = b''
+    for block in blocks:
+        if tail:
+            block = tail + block
+        cut = block.rfind(b'\n') + 1
+        tail = block[cut:]  # Unfinished line, completed by the next block
+        if cut:
+            yield parse_block_lines(block[:cut], tokens, encoding, stats)
+    if tail:
+        yield parse_block_lines(tail, tokens, encoding, stats)
+
+# Function to parse one block of whole lines as a column batch
+# Lines without the prefilter tokens are dropped first, then one findall call parses the rest
+def parse_block_lines(data, tokens, encoding, stats=None):
+    started = time.perf_counter()
+    lines = data.split(b'\n')
+    if not lines[-1]:
+        lines.pop()  # After the last newline
+    if len(tokens) == 2:
+        first_token, second_token = tokens
+        kept_lines = [line for line in lines if first_token in line and second_token in line]
+    elif tokens:
+        token = tokens[0]
+        kept_lines = [line for line in lines if token in line]
+    else:
+        kept_lines = lines
+    filtered = time.perf_counter()
+
+    batch = parse_log_block((b'\n'.join(kept_lines) if tokens else data).decode(encoding))
+    parsed = time.perf_counter()
+
+    if stats:
+        parsed_count = len(batch['status_code'])
+        if parsed_count < len(kept_lines):
+            stats.add_unmatched_lines(kept_lines, len(kept_lines) - parsed_count, encoding)
+        if tokens:
+            stats.sample_prefiltered_lines(lines, tokens, encoding)
+    return batch, len(lines), len(kept_lines), filtered - started, parsed - filtered
+
+# Function to send a column batch to all reports, returning the seconds each report took
+def add_batch_to_reports(batch, reports):
+    report_seconds = [0.0] * len(reports)
+    if batch['status_code']:
+        added = time.perf_counter()
+        for index, report in enumerate(reports):
+            report.add_batch(batch)
+            report_seconds[index] = time.perf_counter() - added
+            added += report_seconds[index]
+    return report_seconds
+
+# Columnar cache: every parsed line of an archive, with repeated strings stored once in a table
+# and each row holding an index into it. Saved next to the archive as "<archive>.logcache"
+cache_string_fields = ['ip_address', 'timestamp', 'method', 'request_path', 'user_agent']
+cache_number_fields = ['status_code', 'response_size']
+cache_batch_rows = 100000  # Cached rows sent to the reports per column batch
+
+# Function to get the cache file path for a log archive
+def log_cache_path(log_file_path):
+    return log_file_path + '.logcache'
+
+# Function to describe the source file, so a cache is only used while the archive is unchanged
+def log_cache_key(log_file_path):
+    stat = os.stat(log_file_path)
+    # The format of the parser in use, which is what the rows were parsed with (None for log_pattern)
+    parser_format = log_parser.log_format if log_parser else None
+    return {'version': log_cache_version, 'log_format': parser_format, 'source_size': stat.st_size, 'source_mtime': stat.st_mtime_ns}
+
+# Function to check whether an archive has a cache file built from its current contents
+def is_log_cache_fresh(log_file_path):
+    try:
+        with open(log_cache_path(log_file_path), 'rb') as cache_file:
+            return pickle.load(cache_file) == log_cache_key(log_file_path)  # Only the header is read
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return False
+
+# Function to parse a whole log archive into a columnar cache file next to it
+def build_log_cache(log_file_path):
+    print(f"Caching {log_file_path}...")
+    cache_key = log_cache_key(log_file_path)
+    tables = {field: {} for field in cache_string_fields}  # Value -> index, in first-seen order
+    columns = {field: array('L') for field in cache_string_fields}
+    columns.update({field: array('q') for field in cache_number_fields})
+
+    with open_log_file(log_file_path) as log_file:
+        for line in log_file:
+            log_data = parse_log_line(line)
+            if log_data:
+                for field in cache_string_fields:
+                    table = tables[field]
+                    value = log_data[field]
+                    index = table.get(value)
+                    if index is None:
+                        index = table[value] = len(table)
+                    columns[field].append(index)
+                for field in cache_number_fields:
+                    columns[field].append(log_data[field])
+
+    # Write to a temporary file first so an interrupted run never leaves a half-written cache
+    cache_path = log_cache_path(log_file_path)
+    with open(cache_path + '.tmp', 'wb') as cache_file:
+        pickle.dump(cache_key, cache_file)
+        pickle.dump({field: list(table) for field, table in tables.items()}, cache_file, pickle.HIGHEST_PROTOCOL)
+        pickle.dump(columns, cache_file, pickle.HIGHEST_PROTOCOL)
+    os.replace(cache_path + '.tmp', cache_path)
+    return cache_path
+
+# Function to build the cache of every .gz archive that doesn't have a fresh one yet
+def build_log_caches(log_path, workers=1):
+    stale_paths = [path for path in list_log_files(log_path) if path.endswith('.gz') and not is_log_cache_fresh(path)]
+    if workers > 1 and len(stale_paths) > 1:
+        with Pool(workers) as pool:
+            return pool.map(build_log_cache, stale_paths)
+    return [build_log_cache(path) for path in stale_paths]
+
+# Function to send the cached rows to all reports as column batches, like parsed blocks
+def process_log_cache(log_file_path, reports, stats=None):
+    for batch, row_count, kept_count, filter_seconds, build_seconds in read_log_cache_batches(log_file_path, shared_report_needs(reports), stats):
+        report_seconds = add_batch_to_reports(batch, reports)
+        if stats:
+            stats.add_block(row_count, kept_count, kept_count, filter_seconds, build_seconds, report_seconds)
+
+# Function to read the cached rows as column batches, yielding (batch, rows, rows kept, filter seconds, build seconds)
+# Rows not matching needs (status, method, path_contains) are skipped on the index columns, before any string is looked up
+def read_log_cache_batches(log_file_path, needs, stats=None):
+    started = time.perf_counter()
+    with open(log_cache_path(log_file_path), 'rb') as cache_file:
+        pickle.load(cache_file)  # Header, already checked
+        tables = pickle.load(cache_file)
+        columns = pickle.load(cache_file)
+
+    status, method, path_contains = needs
+    method_table = tables['method']
+    wanted_method = method_table.index(method) if method in method_table else -1
+    wanted_paths = [path_contains in path for path in tables['request_path']] if path_contains else None
+    status_column, method_column, path_column = columns['status_code'], columns['method'], columns['request_path']
+    row_count = len(status_column)
+
+    if stats:
+        # Counted as the archive it stands for, for the ETA
+        stats.add_read(os.path.getsize(log_file_path), seconds=time.perf_counter() - started)
+
+    for batch_start in range(0, row_count, cache_batch_rows):
+        batch_started = time.perf_counter()
+        rows = range(batch_start, min(batch_start + cache_batch_rows, row_count))
+        kept_rows = rows
+        if status is not None:
+            kept_rows = [row for row in kept_rows if status_column[row] == status]
+        if method is not None:
+            kept_rows = [row for row in kept_rows if method_column[row] == wanted_method]
+        if wanted_paths:
+            kept_rows = [row for row in kept_rows if wanted_paths[path_column[row]]]
+        filtered = time.perf_counter()
+
+        batch = {}
+        for field in log_fields:
+            column = columns[field]
+            values = column[batch_start:rows.stop] if kept_rows is rows else map(column.__getitem__, kept_rows)
+            batch[field] = list(map(tables[field].__getitem__, values) if field in tables else values)
+        built = time.perf_counter()
+
+        if stats and kept_rows is not rows:
+            # Sample the skipped rows like prefiltered lines (cached rows always matched log_pattern)
+            for row in rows[stats.prefilter_sample_offset::stats_sample_every]:
+                if ((status is not None and status_column[row] != status) or (method is not None and method_column[row] != wanted_method)
+                        or (wanted_paths and not wanted_paths[path_column[row]])):
+                    stats.add_prefiltered_sample({'status_code': status_column[row], 'method': method_table[method_column[row]],
+                                                  'request_path': tables['request_path'][path_column[row]]})
+            stats.prefilter_sample_offset = (stats.prefilter_sample_offset - len(rows)) % stats_sample_every
+        yield batch, len(rows), len(kept_rows), filtered - batch_started, built - filtered
+
+# Function to read a plain or .gz log file as large blocks of decompressed bytes
+# Pass stats to count the bytes read and decompressed, and the time spent on it
+def read_log_blocks(log_file_path, stats=None):
+    if not stats:
+        return decompress_log_blocks(log_file_path)
+    return time_log_blocks(decompress_log_blocks(log_file_path, stats), stats)
+
+# Function to time the reading of each block
+def time_log_blocks(blocks, stats):
+    while True:
+        started = time.perf_counter()
+        block = next(blocks, None)
+        if block is None:
+            stats.add_read(seconds=time.perf_counter() - started)
+            return
+        stats.add_read(bytes_decompressed=len(block), seconds=time.perf_counter() - started)
+        yield block
+
+# Function to read a log file's raw blocks from disk and decompress them if it's a .gz
+def decompress_log_blocks(log_file_path, stats=None):
+    with open(log_file_path, 'rb') as log_file:
+        disk_blocks = iter(lambda: log_file.read(log_block_size), b'')
+        if stats:
+            disk_blocks = count_disk_bytes(disk_blocks, stats)
+        if not log_file_path.endswith('.gz'):
+            yield from disk_blocks
+            return
+
+        decompressor = zlib_backend.decompressobj(16 + zlib.MAX_WBITS)  # Expect a gzip header
+        for data in disk_blocks:
+            while data:
+                block = decompressor.decompress(data)
+                if block:
+                    yield block
+                if not decompressor.eof:
+                    break
+                # Rotated logs can hold several gzip members back to back
+                data = decompressor.unused_data
+                decompressor = zlib_backend.decompressobj(16 + zlib.MAX_WBITS)
+        block = decompressor.flush()
+        if block:
+            yield block
+
+# Function to count the bytes read from disk, for the progress and ETA
+def count_disk_bytes(disk_blocks, stats):
+    for data in disk_blocks:
+        stats.add_read(len(data))
+        yield data
+
+# Function to read the blocks of several log files in a background thread, staying a few blocks ahead
+# Returns an iterator of (log_file_path, block) items, with a None block marking the end of each file
+# Decompression releases the GIL, so it runs alongside the parsing of the blocks already read
+def read_ahead(log_file_paths, depth, stats=None):
+    items = Queue(maxsize=depth)
+    stop = Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def read_files():
+        try:
+            for log_file_path in log_file_paths:
+                for block in read_log_blocks(log_file_path, stats):
+                    if not put((log_file_path, block)):
+                        return
+                put((log_file_path, None))
+        except Exception as error:  # Raised again in the reading thread
+            put((None, error))
+
+    Thread(target=read_files, daemon=True).start()
+
+    def read_items():
+        try:
+            while True:
+                log_file_path, block = items.get()
+                if log_file_path is None:
+                    raise block
+                yield log_file_path, block
+        finally:
+            stop.set()  # Lets the thread finish if the reader stops early
+
+    return read_items()
+
+# Function to take one file's blocks from a read_ahead iterator
+def take_file_blocks(items):
+    for log_file_path, block in items:
+        if block is None:
+            return
+        yield block
+
+# Function to read log files in order and send each parsed line to all reports
+# Files with a fresh cache are read from it; the others are decompressed ahead in a background thread
+def process_log_files(log_file_paths, reports, stats=None):
+    cached = {path for path in log_file_paths if use_log_cache and path.endswith('.gz') and is_log_cache_fresh(path)}
+    items = read_ahead([path for path in log_file_paths if path not in cached], read_ahead_blocks, stats)
+    try:
+        for log_file_path in log_file_paths:
+            if log_file_path in cached:
+                print(f"Processing {log_file_path} (from cache)...")
+                process_log_cache(log_file_path, reports, stats)
+            else:
+                print(f"Processing {log_file_path}...")
+                process_log_blocks(take_file_blocks(items), reports, log_encoding, stats)
+    finally:
+        items.close()
+    return reports
+
+# Function to read one log file and send each parsed line to all reports
+def process_log_file(log_file_path, reports, stats=None):
+    return process_log_files([log_file_path], reports, stats)
+
+# Function to get the timestamp of a raw log line without the full regex (None if it has none)
+def line_timestamp(line):
+    start = line.find('[')
+    end = line.find(']', start)
+    if start < 0 or end < 0:
+        return None
+    try:
+        return parse_timestamp(line[start + 1:end])
+    except ValueError:
+        return None
+
+# Function to get the first timestamp of a log file from its raw lines (None if it has none)
+def first_log_timestamp(log_file_path):
+    with open_log_file(log_file_path) as log_file:
+        for line in log_file:
+            timestamp = line_timestamp(line)
+            if timestamp is not None:
+                return timestamp
+    return None
+
+# Function to read one log file as column batches, from its cache when it's fresh, otherwise
+# from blocks decompressed ahead in a background thread, prefiltered and parsed like a normal run
+def read_log_batches(log_file_path, needs, stats=None):
+    if use_log_cache and log_file_path.endswith('.gz') and is_log_cache_fresh(log_file_path):
+        yield from read_log_cache_batches(log_file_path, needs, stats)
+        return
+    items = read_ahead([log_file_path], read_ahead_blocks, stats)
+    try:
+        yield from parse_log_blocks(take_file_blocks(items), line_filter_tokens(*needs, as_bytes=True), log_encoding, stats)
+    finally:
+        items.close()
+
+# One log file in a chronological merge: its current column batch, the timestamp of each row and the next row to send
+# Rows without a readable timestamp get the one before them, so they stay in place
+class TimedLogBatches:
+    def __init__(self, log_file_path, index, needs, stats=None):
+        self.index = index
+        self.stats = stats
+        self.batches = read_log_batches(log_file_path, needs, stats)
+        self.timestamp = None
+        self.batch = None
+
+    # Function to move to the next batch with timestamped rows, returning False at the end of the file
+    def next_batch(self):
+        for batch, line_count, kept_count, filter_seconds, parse_seconds in self.batches:
+            if self.stats:
+                self.stats.add_block(line_count, kept_count, len(batch['status_code']), filter_seconds, parse_seconds)
+            timestamps = []
+            for raw_timestamp in batch['timestamp']:
+                try:
+                    self.timestamp = parse_timestamp(raw_timestamp)
+                except ValueError:
+                    pass
+                timestamps.append(self.timestamp)
+            start = 0
+            while start < len(timestamps) and timestamps[start] is None:
+                start += 1  # Rows before the file's first timestamp
+            if start < len(timestamps):
+                self.batch, self.timestamps, self.position = batch, timestamps, start
+                return True
+        self.batch = None
+        return False
+
+    # Function to get the heap entry of the next row: (timestamp, file index, self)
+    def entry(self):
+        return self.timestamps[self.position], self.index, self
+
+# Function to read several log files and send their parsed rows to all reports in time order, streaming
+# Files are ordered by their first timestamp and only opened once the merge reaches that time, so
+# rotated logs are read one after another and overlapping logs (e.g., several frontends) are
+# heap-merged. Each file goes through the same cache or block reader, prefilter and batch parser as a
+# normal run; runs of rows that come before every other file's next row are copied to the output batch
+# at once. Memory stays proportional to the number of files open at once
+def process_log_files_chronological(log_file_paths, reports, stats=None):
+    needs = shared_report_needs(reports)
+    pending = []
+    for index, log_file_path in enumerate(log_file_paths):
+        first_timestamp = first_log_timestamp(log_file_path)
+        if first_timestamp is None:
+            print(f"Skipping {log_file_path}, no timestamped lines")
+            continue
+        pending.append((first_timestamp, index, log_file_path))
+    pending.sort()
+    pending = deque(pending)
+
+    merged = {field: [] for field in log_fields}
+    heap = []  # (timestamp of the next row, file index, TimedLogBatches)
+    while heap or pending:
+        # Open every file that starts before the next row to be sent
+        while pending and (not heap or pending[0][0] <= heap[0][0]):
+            first_timestamp, index, log_file_path = pending.popleft()
+            print(f"Processing {log_file_path}...")
+            log_batches = TimedLogBatches(log_file_path, index, needs, stats)
+            if log_batches.next_batch():
+                heapq.heappush(heap, log_batches.entry())
+        if not heap:
+            continue  # Every row of the opened files was filtered out
+
+        # Send the top file's rows up to the next row of another file, or the start of the next pending file
+        # (which is opened first on equal times, like a file listed before)
+        timestamp, index, log_batches = heap[0]
+        others = [entry[:2] for entry in heap[1:3]]
+        if pending:
+            others.append((pending[0][0], -1))
+        timestamps, start = log_batches.timestamps, log_batches.position
+        end = len(timestamps)
+        if others:
+            next_timestamp, next_index = min(others)
+            end = start + 1
+            while end < len(timestamps) and (timestamps[end] < next_timestamp or (timestamps[end] == next_timestamp and index < next_index)):
+                end += 1
+        for field, column in merged.items():
+            column.extend(log_batches.batch[field][start:end])
+
+        if end < len(timestamps):
+            log_batches.position = end
+            heapq.heapreplace(heap, log_batches.entry())
+        elif log_batches.next_batch():
+            heapq.heapreplace(heap, log_batches.entry())
+        else:
+            heapq.heappop(heap)  # This file is finished
+
+        if len(merged['timestamp']) >= cache_batch_rows:
+            send_merged_batch(merged, reports, stats)
+            merged = {field: [] for field in log_fields}
+    send_merged_batch(merged, reports, stats)
+
+# Function to send a batch of merged rows to all reports
+def send_merged_batch(batch, reports, stats=None):
+    report_seconds = add_batch_to_reports(batch, reports)
+    if stats:
+        stats.add_report_seconds(report_seconds)
+
+# Function to split a plain log file into byte ranges that start and end on line boundaries
+def split_log_file(log_file_path, range_count):
+    file_size = os.path.getsize(log_file_path)
+    boundaries = [0]
+    with open(log_file_path, 'rb') as log_file:
+        for i in range(1, range_count):
+            # Step back one byte so a target that lands exactly on a line start keeps that line
+            log_file.seek(max(file_size * i // range_count - 1, boundaries[-1]))
+            log_file.readline()  # Move to the start of the next line
+            boundaries.append(log_file.tell())
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+# Function to read a plain log file between two line-aligned byte offsets, in blocks
+def read_log_range(log_file_path, start, end):
+    with open(log_file_path, 'rb') as log_file:
+        log_file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = log_file.read(min(log_block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+# Function to fill empty report copies inside a worker process
+# A task source is a log file path, or a (path, start, end) byte range of a plain log file
+# Returns the filled copies, and the worker's stats when the task asks for them (None otherwise)
+def process_log_task(task):
+    source, partials, with_stats = task
+    stats = RunStats(partials, show_progress=False) if with_stats else None
+    for partial in partials:
+        partial.start_partial()
+
+    if isinstance(source, tuple):
+        log_file_path, start, end = source
+        process_log_blocks(read_log_range(log_file_path, start, end), partials, log_encoding, stats)
+        if stats:
+            stats.add_read(end - start, end - start)
+    else:
+        process_log_file(source, partials, stats)
+
+    for partial in partials:
+        partial.finish_partial()
+    if stats:
+        stats.add_report_filters(partials)
+    return partials, stats
+
+# Function to spread log files or byte ranges across a process pool and merge the partial reports in order
+def process_log_sources_parallel(sources, reports, workers, stats=None):
+    tasks = [(source, [report.empty_copy() for report in reports], stats is not None) for source in sources]
+    with Pool(workers) as pool:
+        # imap returns results in task order, which keeps the merged output identical to a serial run
+        for partials, partial_stats in pool.imap(process_log_task, tasks):
+            for report, partial in zip(reports, partials):
+                report.merge(partial)
+            if stats:
+                stats.merge(partial_stats)
+
+# Function to hash a log file's contents, so a rotated archive is recognized after it's renamed
+def hash_log_file(log_file_path):
+    digest = hashlib.sha256()
+    with open(log_file_path, 'rb') as log_file:
+        for block in iter(lambda: log_file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to load the saved totals into the reports and return the manifest of archives already counted
+# The manifest maps each archive's content hash to the path, size and modified time it had when counted
+def load_report_state(state_path, reports):
+    try:
+        with open(state_path, 'rb') as state_file:
+            state = pickle.load(state_file)
+    except FileNotFoundError:
+        return {}
+
+    config = [report.config_key() for report in reports]
+    if state['version'] != report_state_version or state['config'] != config:
+        print(f"Report settings changed since {state_path} was saved, processing all archives again")
+        return {}
+
+    for report, saved_report in zip(reports, state['reports']):
+        report.merge(saved_report)
+    print(f"Loaded totals for {len(state['manifest'])} archives from {state_path}")
+    return state['manifest']
+
+# Function to save the reports' totals and the manifest for the next incremental run
+def save_report_state(state_path, reports, manifest):
+    state = {
+        'version': report_state_version,
+        'config': [report.config_key() for report in reports],
+        'manifest': manifest,
+        'reports': list(reports),
+    }
+    with open(state_path + '.tmp', 'wb') as state_file:
+        pickle.dump(state, state_file, pickle.HIGHEST_PROTOCOL)
+    os.replace(state_path + '.tmp', state_path)  # Never leave a half-written state behind
+
+# Function to find the archives whose contents aren't in the manifest yet, adding them to it
+# Unchanged archives at the same path aren't hashed again. Archives with the same contents are only new once
+# Returns (path, content hash) pairs of the new archives
+def find_new_log_files(log_file_paths, manifest):
+    known = {(entry['path'], entry['size'], entry['mtime']): content_hash for content_hash, entry in manifest.items()}
+    new_log_files = []
+    for log_file_path in log_file_paths:
+        stat = os.stat(log_file_path)
+        entry = {'path': log_file_path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        content_hash = known.get((log_file_path, stat.st_size, stat.st_mtime_ns)) or hash_log_file(log_file_path)
+        if content_hash not in manifest:
+            new_log_files.append((log_file_path, content_hash))
+        manifest[content_hash] = entry  # Record the current name of renamed archives
+    return new_log_files
+
+# Function to read every log file once and send each parsed line to all registered reports
+# Set workers above 1 to process a folder of .gz archives, or byte ranges of one plain file, in parallel
+# Set state_path to only process archives that weren't counted by a previous run
+# Set chronological to read a folder's plain and .gz logs merged in time order, for reports that follow visitors
+# Run stats are saved to stats_path, by default next to the first report's export (see use_run_stats)
+def run_reports(log_path, reports, workers=1, state_path=None, chronological=False, stats_path=None):
+    if chronological and (workers > 1 or state_path):
+        raise ValueError("Chronological runs read every file in one time-ordered stream, use workers=1 and no state_path")
+    not_mergeable = [report.name for report in reports if not report.mergeable]
+    if workers > 1 and not_mergeable:
+        raise ValueError(f"These reports can't run with workers > 1: {', '.join(not_mergeable)}")
+    not_persistent = [report.name for report in reports if not report.persistent]
+    if state_path and not_persistent:
+        raise ValueError(f"These reports can't run incrementally: {', '.join(not_persistent)}")
+    if state_path and not os.path.isdir(log_path):
+        raise ValueError("Incremental runs need a folder of .gz archives, a growing log file would be counted twice")
+
+    for report in reports:
+        report.start()
+
+    log_file_paths = list_log_files(log_path, include_plain=chronological)
+    if state_path:
+        manifest = load_report_state(state_path, reports)
+        log_file_paths = [path for path, content_hash in find_new_log_files(log_file_paths, manifest)]
+        print(f"{len(log_file_paths)} new archives to process")
+
+    if stats_path is None and use_run_stats:
+        stats_path = os.path.splitext(reports[0].export_path)[0] + '.stats.json'
+    stats = None
+    if stats_path:
+        stats = RunStats(reports, sum(os.path.getsize(path) for path in log_file_paths))
+        stats.files = len(log_file_paths)
+
+    if chronological:
+        process_log_files_chronological(log_file_paths, reports, stats)
+    elif workers > 1 and len(log_file_paths) > 1:
+        process_log_sources_parallel(log_file_paths, reports, workers, stats)
+    elif workers > 1 and len(log_file_paths) == 1 and not log_file_paths[0].endswith('.gz'):
+        log_file_path = log_file_paths[0]
+        range_count = max(workers, os.path.getsize(log_file_path) // log_range_size)
+        print(f"Processing {log_file_path} in {range_count} byte ranges...")
+        ranges = split_log_file(log_file_path, range_count)
+        process_log_sources_parallel([(log_file_path, start, end) for start, end in ranges], reports, workers, stats)
+    else:
+        process_log_files(log_file_paths, reports, stats)
+
+    if stats:
+        stats.add_report_filters(reports)  # Serial runs count on the reports themselves
+        lines_unmatched = stats.lines_unmatched_total()
+        print(f"Parsed {stats.lines_parsed:,} of {stats.lines_read:,} lines ({lines_unmatched:,} didn't match log_pattern)")
+        if lines_unmatched > stats.lines_read / 2:
+            print("Warning: most lines didn't match log_pattern, check your log format with testparse.py"
+                  f" (examples in {stats_path})")
+
+    if state_path:
+        save_report_state(state_path, reports, manifest)
+
+    for report in reports:
+        report.export()
+        print(f"{report.name} saved to {report.export_path}")
+
+    if stats:
+        stats.export(stats_path)
+        print(f"Run stats saved to {stats_path}")
+
+# Function to follow a growing log file like "tail -F", yielding lists of new lines (as bytes)
+# Only new bytes are read. Rotation (a new file at the path) and truncation are detected between reads,
+# and an empty list is yielded after each idle poll so the caller can do periodic work
+def follow_log_lines(log_file_path, poll_interval=1.0, from_start=False):
+    log_file = open(log_file_path, 'rb')
+    if not from_start:
+        log_file.seek(0, os.SEEK_END)
+    inode = os.fstat(log_file.fileno()).st_ino
+    tail = b''
+
+    try:
+        while True:
+            data = log_file.read(log_block_size)
+            if data:
+                lines = (tail + data).split(b'\n')
+                tail = lines.pop()  # Unfinished line, completed by the next read
+                yield lines
+                continue
+
+            try:
+                stat = os.stat(log_file_path)
+            except FileNotFoundError:
+                stat = None  # Rotated away and not recreated yet
+
+            if stat is not None and stat.st_ino != inode:
+                # Rotated: the old file is fully read, switch to the new one from its start
+                log_file.close()
+                log_file = open(log_file_path, 'rb')
+                inode = os.fstat(log_file.fileno()).st_ino
+                lines, tail = ([tail] if tail else []), b''
+                yield lines
+                continue
+
+            if stat is not None and stat.st_size < log_file.tell():
+                # Truncated (e.g., copytruncate rotation): start again from the beginning
+                log_file.seek(0)
+                tail = b''
+                continue
+
+            yield []
+            time.sleep(poll_interval)
+    finally:
+        log_file.close()
+
+# Rolling-window totals of a mergeable report for live mode
+# Lines go into one empty report copy per time bucket (by log timestamp). Buckets older than the longest
+# window are dropped, and a window's snapshot merges the buckets inside it into a fresh copy
+class RollingWindows:
+    def __init__(self, report, windows, bucket_seconds=60):
+        self.report = report
+        self.windows = windows  # [(label, seconds)], e.g. [('15m', 900), ('1h', 3600)]
+        self.bucket_seconds = bucket_seconds
+        self.buckets = {}  # Bucket start (epoch seconds) -> partial report
+
+        # Lines the report needs, so the live reader can skip the rest before parsing
+        self.status = report.status
+        self.method = report.method
+        self.path_contains = report.path_contains
+
+    def add(self, log_data):
+        timestamp = parse_timestamp(log_data['timestamp']).timestamp()
+        bucket_start = int(timestamp // self.bucket_seconds * self.bucket_seconds)
+        bucket = self.buckets.get(bucket_start)
+        if bucket is None:
+            bucket = self.buckets[bucket_start] = self.report.empty_copy()
+        bucket.add(log_data)
+
+    # Drops buckets that fell out of the longest window
+    def expire(self, now):
+        oldest_start = now - max(seconds for label, seconds in self.windows) - self.bucket_seconds
+        for bucket_start in [start for start in self.buckets if start <= oldest_start]:
+            del self.buckets[bucket_start]
+
+    # Writes one CSV per window, named after the report's export path, e.g. "search_terms_15m.csv"
+    def snapshot(self, now):
+        self.expire(now)
+        export_root, export_extension = os.path.splitext(self.report.export_path)
+        for label, seconds in self.windows:
+            window_report = self.report.empty_copy()
+            window_report.export_path = f"{export_root}_{label}{export_extension}"
+            for bucket_start in sorted(self.buckets):
+                if bucket_start + self.bucket_seconds > now - seconds:
+                    window_report.merge(self.buckets[bucket_start])  # Reads the bucket, which keeps filling
+            window_report.export()
+
+# Function to follow the active log file and write rolling-window snapshots of the reports
+# Runs until Ctrl+C (or for `duration` seconds), writing a last snapshot on the way out
+def run_live_reports(log_file_path, reports, windows, snapshot_interval=60, bucket_seconds=60, from_start=False, duration=None):
+    # Exports merge by moving a worker's part file, so a bucket can't be merged into every snapshot
+    not_mergeable = [report.name for report in reports if not report.mergeable or isinstance(report, BatchExportReport)]
+    if not_mergeable:
+        raise ValueError(f"These reports can't run in live mode: {', '.join(not_mergeable)}")
+
+    rolling_reports = [RollingWindows(report, windows, bucket_seconds) for report in reports]
+    started = time.time()
+    next_snapshot = started + snapshot_interval
+    print(f"Following {log_file_path}, press Ctrl+C to stop...")
+    try:
+        for lines in follow_log_lines(log_file_path, from_start=from_start):
+            if lines:
+                process_log_lines(lines, rolling_reports, encoding=log_encoding)
+
+            now = time.time()
+            if now >= next_snapshot:
+                for rolling_report in rolling_reports:
+                    rolling_report.snapshot(now)
+                print(f"Snapshot saved at {datetime.now():%H:%M:%S}")
+                next_snapshot = now + snapshot_interval
+            if duration is not None and now - started >= duration:
+                break
+    except KeyboardInterrupt:
+        pass
+
+    for rolling_report in rolling_reports:
+        rolling_report.snapshot(time.time())
+    print("Final snapshot saved")
@@ -0,0 +1,289 @@
+# Log format compiler: turns an nginx log_format or Apache LogFormat string into a parser for those lines
+#
+# Usage:
+#   log_parser = compile_log_format('$remote_addr - $remote_user [$time_local] "$request" $status '
+#                                   '$body_bytes_sent "$http_referer" "$http_user_agent"')
+#   log_parser.parse_line(line)   # {'ip_address': '1.2.3.4', 'timestamp': '10/Oct/2024:13:55:36 -0700', ...} or None
+#   log_parser.parse_block(text)  # {'ip_address': [...], ...}, one value per matching line
+#
+# The parser is Python code generated for the format: it cuts each line at the literal text between
+# the fields with str.index and slices, and only converts the fields asked for. Lines it can't cut
+# cleanly (a missing separator, a separator character inside a field, an escaped quote, a non-numeric status)
+# go to a regex built from the same format, so both give the same result for every line. Formats with two
+# fields touching, like "$status$body_bytes_sent", use the regex for every line.
+#
+# Field names follow logengine.log_fields. The timestamp is kept as the raw "10/Oct/2024:13:55:36 -0700" string
+
+# Libraries
+import re
+
+# Formats shipped with nginx and Apache, and the one logengine.log_pattern was written for
+nginx_combined = '$remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent"'
+apache_combined = '%h %l %u %t "%r" %>s %b "%{Referer}i" "%{User-agent}i"'
+apache_common = '%h %l %u %t "%r" %>s %b'
+log_pattern_format = '$remote_addr - - [$time_local] $status "$request" $body_bytes_sent "$http_referer" "$http_user_agent"'
+
+# Fields the parser can extract, with the value used when a format doesn't log one
+field_defaults = {'ip_address': '', 'timestamp': '', 'status_code': 0, 'method': '', 'request_path': '',
+                  'response_size': 0, 'user_agent': '', 'referer': ''}
+number_fields = ('status_code', 'response_size')
+
+# nginx variables -> fields ("request" is the request line, split into method and request_path)
+nginx_variables = {
+    'remote_addr': 'ip_address',
+    'time_local': 'timestamp',
+    'status': 'status_code',
+    'request': 'request',
+    'request_method': 'method',
+    'request_uri': 'request_path',
+    'body_bytes_sent': 'response_size',
+    'bytes_sent': 'response_size',
+    'http_user_agent': 'user_agent',
+    'http_referer': 'referer',
+}
+
+# Apache directives -> fields, with headers as "i:<lowercase header name>"
+apache_directives = {
+    'h': 'ip_address',
+    'a': 'ip_address',
+    't': 'timestamp',
+    's': 'status_code',
+    '>s': 'status_code',
+    'r': 'request',
+    'm': 'method',
+    'U': 'request_path',
+    'b': 'response_size',
+    'B': 'response_size',
+    'i:user-agent': 'user_agent',
+    'i:referer': 'referer',
+}
+
+nginx_variable_pattern = re.compile(r'\$(?:\{(\w+)\}|(\w+))')
+apache_directive_pattern = re.compile(r'%(<|>)?(?:!?\d+(?:,\d+)*)?(?:\{([^}]*)\})?([a-zA-Z%])')
+
+# Function to get the format string out of a pasted nginx log_format or Apache LogFormat line
+# Accepts the bare format too. nginx joins the quoted pieces of a log_format; both unescape \"
+def unwrap_log_format(log_format):
+    text = log_format.strip()
+    if text.startswith('log_format'):
+        pieces = re.findall(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"", text)
+        text = ''.join(single or double for single, double in pieces)
+    elif text.startswith('LogFormat'):
+        match = re.match(r'LogFormat\s+"((?:[^"\\]|\\.)*)"', text)
+        if not match:
+            raise ValueError(f"Can't read the format string in {log_format!r}")
+        text = match.group(1)
+    return text.replace('\\"', '"')
+
+# Function to split a format string into literal text and fields
+# Returns a list of ('literal', text) and ('field', name) items, with None as the name of fields nobody parses
+def tokenize_log_format(log_format):
+    text = unwrap_log_format(log_format)
+    tokens = []
+
+    def add_literal(literal):
+        if tokens and tokens[-1][0] == 'literal':
+            tokens[-1] = ('literal', tokens[-1][1] + literal)
+        elif literal:
+            tokens.append(('literal', literal))
+
+    is_apache = '%' in text and not nginx_variable_pattern.search(text)
+    pattern = apache_directive_pattern if is_apache else nginx_variable_pattern
+    position = 0
+    for match in pattern.finditer(text):
+        add_literal(text[position:match.start()])
+        position = match.end()
+        if not is_apache:
+            tokens.append(('field', nginx_variables.get(match.group(1) or match.group(2))))
+            continue
+
+        modifier, argument, directive = match.groups()
+        if directive == '%':
+            add_literal('%')
+        elif directive == 't' and argument is None:
+            # %t logs the time in brackets, like nginx's [$time_local]
+            add_literal('[')
+            tokens.append(('field', 'timestamp'))
+            add_literal(']')
+        elif directive == 'i' and argument:
+            tokens.append(('field', apache_directives.get('i:' + argument.lower())))
+        elif argument is None:
+            tokens.append(('field', apache_directives.get((modifier or '') + directive)))
+        else:
+            tokens.append(('field', None))
+    add_literal(text[position:])
+    return tokens
+
+# Function to get the regex for one field, bounded by the literal text around it
+# Quoted fields allow backslash-escaped quotes inside, as Apache writes them. No part of a match crosses a line end
+def field_regex(field, before, after, wanted):
+    def group(name, value_regex):
+        return f'(?P<{name}>{value_regex})' if name in wanted else f'(?:{value_regex})'
+
+    stop = re.escape(after[0]) if after else ''
+    if field == 'status_code':
+        return group(field, r'\d+')
+    if field == 'response_size':
+        return group(field, r'\d+|-')
+    quoted = before.endswith('"') and after.startswith('"')
+    if field == 'request':
+        path_regex = r'(?:[^"\\\n]|\\.)*?' if quoted else rf'[^{stop}\n]*?'
+        return (group('method', rf'[^ {stop}\n]+') + ' ' + group('request_path', path_regex)
+                + r'(?: HTTP/[\d.]+)?')
+    if quoted:
+        value_regex = r'[^"\\\n]*(?:\\.[^"\\\n]*)*'  # Same strings as (?:[^"\\\n]|\\.)*, without a step per character
+    else:
+        value_regex = rf'[^{stop}\n]*'
+    return group(field, value_regex) if field else value_regex
+
+# Function to build the regex for a whole format, with a named group for each wanted field
+def log_format_regex(tokens, wanted):
+    parts = []
+    for index, (kind, value) in enumerate(tokens):
+        if kind == 'literal':
+            parts.append(re.escape(value))
+        else:
+            before = tokens[index - 1][1] if index > 0 and tokens[index - 1][0] == 'literal' else ''
+            after = tokens[index + 1][1] if index + 1 < len(tokens) and tokens[index + 1][0] == 'literal' else ''
+            parts.append(field_regex(value, before, after, wanted))
+    return ''.join(parts)
+
+# Function to generate the body of the index-based parser: lines of code that set a local per wanted field
+# from "line", or raise ValueError where the regex has to decide. Returns None if the format can't be cut this way
+def index_parser_code(tokens, wanted):
+    code = []
+    start = 0
+    leading = ''
+    if tokens and tokens[0][0] == 'literal':
+        leading = tokens[0][1]
+        code.append(f"if not line.startswith({tokens[0][1]!r}): raise ValueError")
+        start = len(tokens[0][1])
+        tokens = tokens[1:]
+    code.append(f"start = {start}")
+
+    for index in range(0, len(tokens), 2):
+        field = tokens[index][1]
+        after = tokens[index + 1][1] if index + 1 < len(tokens) else ''
+        if tokens[index][0] != 'field' or (index + 1 < len(tokens) and tokens[index + 1][0] != 'literal'):
+            return None  # Two fields with nothing between them
+        needed = field in wanted or field == 'request' and ('method' in wanted or 'request_path' in wanted)
+        before = tokens[index - 1][1] if index > 0 else leading
+        if not after and not needed:
+            break  # Nothing left to check or extract
+
+        if after:
+            # Cut at the first character of the separator, like the regex, so a field never holds a space
+            # (unquoted) or a quote (quoted), then check the rest of the separator follows
+            code.append(f"end = line.index({after[0]!r}, start)")
+            if len(after) > 1:
+                code.append(f"if not line.startswith({after!r}, end): raise ValueError")
+        else:
+            code.append("end = line.find('\\n', start)")
+            code.append("if end < 0: end = len(line)")
+        quoted = before.endswith('"') and after.startswith('"')
+        if quoted and needed and field == 'request':
+            code.append("if line.find('\\\\', start, end) >= 0: raise ValueError")  # An escape can move where the path ends
+        elif quoted:
+            code.append("if line[end - 1] == '\\\\': raise ValueError")  # Escaped quote: the regex finds the real end
+
+        if needed and field == 'request':
+            code.append("method, space, rest = line[start:end].partition(' ')")
+            code.append("if not space or not method: raise ValueError")
+            code.append("request_path, space, protocol = rest.rpartition(' ')")
+            code.append("if not space or not protocol.startswith('HTTP/') or not protocol[5:].replace('.', '0').isdecimal(): request_path = rest")
+        elif needed and field == 'response_size':
+            code.append("response_size = line[start:end]")
+            code.append("if response_size != '-' and not response_size.isdecimal(): raise ValueError")  # int() allows ' 5', '+5', '5_0'
+            code.append("response_size = 0 if response_size == '-' else int(response_size)")
+        elif needed and field == 'status_code':
+            code.append("status_code = line[start:end]")
+            code.append("if not status_code.isdecimal(): raise ValueError")
+            code.append("status_code = int(status_code)")
+        elif needed:
+            code.append(f"{field} = line[start:end]")
+        if index + 2 < len(tokens):
+            code.append(f"start = end + {len(after)}")
+    return code
+
+# A parser compiled from a log format, see compile_log_format
+class LogParser:
+    def __init__(self, log_format, fields):
+        self.log_format = log_format
+        self.fields = list(fields)
+        self.tokens = tokenize_log_format(log_format)
+        logged = {value for kind, value in self.tokens if kind == 'field'}
+        if 'request' in logged:
+            logged.update(('method', 'request_path'))
+        unknown = [field for field in self.fields if field not in field_defaults]
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}, choose from {list(field_defaults)}")
+        self.missing_fields = [field for field in self.fields if field not in logged]  # Filled with field_defaults
+
+        wanted = set(self.fields)
+        self.pattern = re.compile(log_format_regex(self.tokens, wanted))
+        self.block_pattern = re.compile('^' + self.pattern.pattern, re.MULTILINE)
+        self.index_code = index_parser_code(self.tokens, wanted)
+        self.source = self.generate_source()
+        namespace = {'pattern': self.pattern, 'defaults': field_defaults}
+        exec(compile(self.source, f'<log format {log_format!r}>', 'exec'), namespace)
+        self.parse_line = namespace['parse_line']
+        self.parse_block = namespace['parse_block']
+        self.regex_parse_line = namespace['regex_parse_line']
+        self.uses_index_parser = self.index_code is not None
+
+    # Returns the Python source of the parser functions
+    def generate_source(self):
+        logged_fields = [field for field in self.fields if field not in self.missing_fields]
+        values = ', '.join(f"{field!r}: {field if field in logged_fields else f'defaults[{field!r}]'}" for field in self.fields)
+
+        source = ["def regex_parse_line(line):",
+                  "    match = pattern.match(line)",
+                  "    if match is None: return None"]
+        for field in logged_fields:
+            convert = "int(match.group('status_code'))" if field == 'status_code' else (
+                "0 if match.group('response_size') == '-' else int(match.group('response_size'))" if field == 'response_size'
+                else f"match.group({field!r})")
+            source.append(f"    {field} = {convert}")
+        source.append(f"    return {{{values}}}")
+        source.append("")
+
+        source.append("def parse_line(line):")
+        if self.index_code is None:
+            source.append("    return regex_parse_line(line)")
+        else:
+            source.append("    try:")
+            source.extend("        " + line for line in self.index_code)
+            source.append("    except ValueError:")
+            source.append("        return regex_parse_line(line)")
+            source.append(f"    return {{{values}}}")
+        source.append("")
+
+        # Block parser: one list per field, appended to only once every field of a line is parsed
+        source.append("def parse_block(text):")
+        for field in self.fields:
+            source.append(f"    {field}_column = []")
+        source.append("    for line in text.split('\\n'):")
+        if self.index_code is None:
+            source.append("        row = regex_parse_line(line)")
+            source.append("        if row is None: continue")
+            for field in logged_fields:
+                source.append(f"        {field} = row[{field!r}]")
+        else:
+            source.append("        try:")
+            source.extend("            " + line for line in self.index_code)
+            source.append("        except ValueError:")
+            source.append("            row = regex_parse_line(line)")
+            source.append("            if row is None: continue")
+            for field in logged_fields:
+                source.append(f"            {field} = row[{field!r}]")
+        for field in self.fields:
+            value = field if field in logged_fields else f"defaults[{field!r}]"
+            source.append(f"        {field}_column.append({value})")
+        source.append("    return {" + ', '.join(f"{field!r}: {field}_column" for field in self.fields) + "}")
+        return '\n'.join(source) + '\n'
+
+# Function to compile a log format into a parser that extracts only the given fields
+# log_format is an nginx log_format or Apache LogFormat string (or the whole directive, pasted from the server config)
+def compile_log_format(log_format, fields=('ip_address', 'timestamp', 'status_code', 'method', 'request_path',
+                                           'response_size', 'user_agent')):
+    return LogParser(log_format, fields)
@@ -0,0 +1,316 @@
+# Indexed SQLite log store: parse .gz log archives once into a local database, then answer one-off
+# questions with SQL instead of rescanning the logs
+#
+# Usage:
+#   ingest_logs("nginx-logs/", "logs.sqlite")  # Only archives not ingested before are parsed
+#   run_store_reports("logs.sqlite", [FolderSummaryReport(2, "tier2.csv", bot_list, url_exceptions)],
+#                     start="2024-03-01", end="2024-04-01")
+#
+# Tables:
+#   requests     One row per parsed log line. timestamp is Unix time (seconds) and utc_offset the log's
+#                offset in minutes; path_id and user_agent_id point into the dictionary tables
+#   paths        Each distinct request path once (with its query string)
+#   user_agents  Each distinct user agent once
+#   log_files    The archives already ingested, by content hash
+#   log_lines    A view joining it all back into readable rows
+#
+# Requests are indexed on timestamp, path, status and IP, and paths on their text, so a path prefix
+# query uses the index when written with GLOB (case-sensitive), e.g. "hits to /services/* in March":
+#   SELECT COUNT(*) FROM requests
+#   WHERE path_id IN (SELECT id FROM paths WHERE path GLOB '/services/*')
+#   AND timestamp >= strftime('%s', '2024-03-01') AND timestamp < strftime('%s', '2024-04-01')
+
+# Libraries
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+
+from logengine import (FolderSummaryReport, PageCtrReport, Report, SearchTermsReport, extract_folder,
+                       extract_search_term, find_new_log_files, list_log_files, parse_timestamp,
+                       process_log_file, top_terms)
+
+# Lines inserted per executemany call
+store_batch_size = 100000
+
+store_schema = """
+CREATE TABLE IF NOT EXISTS paths (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS user_agents (id INTEGER PRIMARY KEY, user_agent TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    timestamp INTEGER NOT NULL,
+    utc_offset INTEGER NOT NULL,
+    ip_address TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    path_id INTEGER NOT NULL REFERENCES paths (id),
+    response_size INTEGER NOT NULL,
+    user_agent_id INTEGER NOT NULL REFERENCES user_agents (id)
+);
+CREATE TABLE IF NOT EXISTS log_files (
+    content_hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    ingested TEXT NOT NULL
+);
+CREATE VIEW IF NOT EXISTS log_lines AS
+    SELECT requests.id, datetime(timestamp + utc_offset * 60, 'unixepoch') AS local_time, utc_offset,
+           ip_address, status_code, method, path AS request_path, response_size, user_agent
+    FROM requests
+    JOIN paths ON paths.id = requests.path_id
+    JOIN user_agents ON user_agents.id = requests.user_agent_id;
+"""
+
+# Built after the first bulk load (much faster than keeping them up to date row by row), then kept up to date
+store_indexes = """
+CREATE INDEX IF NOT EXISTS requests_timestamp ON requests (timestamp);
+CREATE INDEX IF NOT EXISTS requests_path ON requests (path_id);
+CREATE INDEX IF NOT EXISTS requests_status ON requests (status_code);
+CREATE INDEX IF NOT EXISTS requests_ip ON requests (ip_address);
+"""
+
+# Function to open (or create) a log store
+def open_log_store(store_path):
+    connection = sqlite3.connect(store_path)
+    connection.execute('PRAGMA journal_mode = WAL')  # Readers can query while new archives are ingested
+    connection.execute('PRAGMA synchronous = NORMAL')  # Safe with WAL, and much faster than FULL
+    connection.executescript(store_schema)
+    return connection
+
+# Report that inserts every parsed log line into the store
+# Paths and user agents are looked up in memory and only new ones are added to their tables
+class LogStoreReport(Report):
+    name = "Log store"
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.path_ids = dict(connection.execute('SELECT path, id FROM paths'))
+        self.user_agent_ids = dict(connection.execute('SELECT user_agent, id FROM user_agents'))
+        super().__init__(None)
+
+    def clear(self):
+        self.rows = []
+        self.new_paths = []
+        self.new_user_agents = []
+        self.lines = 0
+        self.last_timestamp = (None, None, None)  # Raw string, Unix time, offset; consecutive lines often share it
+
+    def add(self, log_data):
+        path = log_data['request_path']
+        path_id = self.path_ids.get(path)
+        if path_id is None:
+            path_id = self.path_ids[path] = len(self.path_ids) + 1
+            self.new_paths.append((path_id, path))
+
+        user_agent = log_data['user_agent']
+        user_agent_id = self.user_agent_ids.get(user_agent)
+        if user_agent_id is None:
+            user_agent_id = self.user_agent_ids[user_agent] = len(self.user_agent_ids) + 1
+            self.new_user_agents.append((user_agent_id, user_agent))
+
+        raw_timestamp, unix_time, utc_offset = self.last_timestamp
+        if log_data['timestamp'] != raw_timestamp:
+            timestamp = parse_timestamp(log_data['timestamp'])
+            unix_time = int(timestamp.timestamp())
+            utc_offset = int(timestamp.utcoffset().total_seconds()) // 60
+            self.last_timestamp = (log_data['timestamp'], unix_time, utc_offset)
+
+        self.rows.append((unix_time, utc_offset, log_data['ip_address'], log_data['status_code'], log_data['method'],
+                          path_id, log_data['response_size'], user_agent_id))
+        if len(self.rows) >= store_batch_size:
+            self.flush()
+
+    # Inserts the buffered lines, inside the caller's transaction
+    def flush(self):
+        self.connection.executemany('INSERT INTO paths (id, path) VALUES (?, ?)', self.new_paths)
+        self.connection.executemany('INSERT INTO user_agents (id, user_agent) VALUES (?, ?)', self.new_user_agents)
+        self.connection.executemany(
+            'INSERT INTO requests (timestamp, utc_offset, ip_address, status_code, method, path_id, response_size, user_agent_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self.rows)
+        self.lines += len(self.rows)
+        self.rows, self.new_paths, self.new_user_agents = [], [], []
+
+    def export(self):
+        pass
+
+# Function to parse the .gz archives of a folder that aren't in the store yet and add their lines
+# Each archive is added in one transaction together with its log_files entry, so an interrupted run
+# never leaves half an archive behind. Renamed archives are recognized by their content hash
+def ingest_logs(log_path, store_path):
+    if not os.path.isdir(log_path):
+        raise ValueError("The log store needs a folder of .gz archives, a growing log file would be added twice")
+
+    connection = open_log_store(store_path)
+    manifest = {content_hash: {'path': path, 'size': size, 'mtime': mtime} for content_hash, path, size, mtime
+                in connection.execute('SELECT content_hash, path, size, mtime FROM log_files')}
+    report = LogStoreReport(connection)
+    try:
+        log_file_paths = [path for path in list_log_files(log_path) if path.endswith('.gz')]
+        new_log_files = find_new_log_files(log_file_paths, manifest)
+        print(f"{len(new_log_files)} new archives to add to {store_path}")
+
+        new_hashes = {content_hash for path, content_hash in new_log_files}
+        for content_hash, entry in manifest.items():
+            if content_hash not in new_hashes:
+                # Keep the recorded name of renamed archives current
+                connection.execute('UPDATE log_files SET path = ?, size = ?, mtime = ? WHERE content_hash = ?',
+                                   (entry['path'], entry['size'], entry['mtime'], content_hash))
+        connection.commit()
+
+        for log_file_path, content_hash in new_log_files:
+            report.lines = 0
+            with connection:
+                process_log_file(log_file_path, [report])
+                report.flush()
+                entry = manifest[content_hash]
+                connection.execute('INSERT INTO log_files VALUES (?, ?, ?, ?, ?, ?)',
+                                   (content_hash, entry['path'], entry['size'], entry['mtime'],
+                                    report.lines, datetime.now().isoformat(timespec='seconds')))
+            print(f"Added {report.lines:,} lines from {log_file_path}")
+
+        first_build = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'requests_timestamp'").fetchone() is None
+        print("Building indexes..." if first_build else "Indexes updated")
+        connection.executescript(store_indexes)
+        # Statistics that let SQLite pick the best index for each query, refreshed when they're out of date
+        connection.execute('ANALYZE' if first_build else 'PRAGMA optimize')
+    finally:
+        connection.close()
+
+# Function to turn a date like "2024-03-01" (UTC unless it has an offset) or a datetime into Unix time
+def store_time(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+# Function to build the SQL condition and parameters for an optional time range (start included, end not)
+def time_range_condition(start=None, end=None):
+    conditions, parameters = [], []
+    if start is not None:
+        conditions.append('requests.timestamp >= ?')
+        parameters.append(store_time(start))
+    if end is not None:
+        conditions.append('requests.timestamp < ?')
+        parameters.append(store_time(end))
+    return ''.join(f' AND {condition}' for condition in conditions), parameters
+
+# Function to fill a folder summary report from the store
+# Bots and URL exclusions are checked once per distinct user agent and path, with the report's own matchers
+def query_folder_summary(connection, report, start=None, end=None):
+    connection.execute('CREATE TEMP TABLE IF NOT EXISTS excluded_user_agents (id INTEGER PRIMARY KEY)')
+    connection.execute('DELETE FROM excluded_user_agents')
+    connection.executemany('INSERT INTO excluded_user_agents VALUES (?)', (
+        (user_agent_id,) for user_agent_id, user_agent in connection.execute('SELECT id, user_agent FROM user_agents')
+        if report.bot_matcher.matches(user_agent)))
+
+    time_condition, parameters = time_range_condition(start, end)
+    rows = connection.execute(f"""
+        SELECT paths.path, COUNT(*) FROM requests JOIN paths ON paths.id = requests.path_id
+        WHERE requests.status_code = 200 AND requests.method = 'GET'
+        AND requests.user_agent_id NOT IN (SELECT id FROM excluded_user_agents){time_condition}
+        GROUP BY requests.path_id
+        ORDER BY MIN(requests.id)""", parameters)  # First seen first, like a scan of the logs
+
+    for path, hits in rows:
+        if report.url_exception_matcher.matches(path):
+            continue
+        folder = extract_folder(path, report.depth)
+        if folder:
+            report.folder_hits[folder] += hits
+            pages = report.folder_pages.get(folder)
+            if pages is None:
+                pages = report.folder_pages[folder] = report.new_page_set()
+            pages.add(urlparse(path).path)
+
+# Function to fill a search terms report from the store
+# Only paths starting with search_url_path are read, using the index on paths (every path for an empty one)
+def query_search_terms(connection, report, start=None, end=None):
+    time_condition, parameters = time_range_condition(start, end)
+    if report.search_url_path:
+        prefix_end = report.search_url_path[:-1] + chr(ord(report.search_url_path[-1]) + 1)
+        path_condition = "requests.path_id IN (SELECT id FROM paths WHERE path >= ? AND path < ?) AND "
+        parameters = [report.search_url_path, prefix_end] + parameters
+    else:
+        path_condition = ""
+    rows = connection.execute(f"""
+        SELECT paths.path, COUNT(*) FROM requests JOIN paths ON paths.id = requests.path_id
+        WHERE {path_condition}requests.status_code = 200 AND requests.method = 'GET'{time_condition}
+        GROUP BY requests.path_id
+        ORDER BY MIN(requests.id)""", parameters)
+
+    counts = {}
+    for path, hits in rows:
+        search_term = extract_search_term(path, report.search_url_path, report.search_param)
+        if search_term:
+            counts[search_term] = counts.get(search_term, 0) + hits
+
+    if report.top_k:
+        # The store gives exact counts, so the kept terms have no count error
+        kept_terms = top_terms(counts, report.search_terms.capacity)
+        report.search_terms.counts = {term: counts[term] for term in kept_terms}
+        report.search_terms.errors = dict.fromkeys(kept_terms, 0)
+    else:
+        report.search_terms = counts
+
+# Function to fill a page CTR report from the store
+# Each visit to filter_path is paired with the same visitor's next 200 request with a window function.
+# Like the scan, a visit counts as an exit when there's no next request within session_timeout seconds,
+# and a visit followed by another visit to filter_path is replaced by it
+def query_page_ctr(connection, report, start=None, end=None):
+    time_condition, parameters = time_range_condition(start, end)
+    visitor = 'requests.ip_address, requests.user_agent_id' if report.session_key_user_agent else 'requests.ip_address'
+    filter_path_id = connection.execute('SELECT id FROM paths WHERE path = ?', (report.filter_path,)).fetchone()
+    if filter_path_id is None:
+        return  # Never visited
+    rows = connection.execute(f"""
+        SELECT timestamp, utc_offset, next_path, next_timestamp, next_id FROM (
+            SELECT requests.path_id, requests.timestamp, requests.utc_offset,
+                   LEAD(paths.path) OVER visitor AS next_path,
+                   LEAD(requests.timestamp) OVER visitor AS next_timestamp,
+                   LEAD(requests.id) OVER visitor AS next_id
+            FROM requests JOIN paths ON paths.id = requests.path_id
+            WHERE requests.status_code = 200{time_condition}
+            AND requests.ip_address IN (SELECT ip_address FROM requests WHERE path_id = ?)
+            WINDOW visitor AS (PARTITION BY {visitor} ORDER BY requests.timestamp, requests.id)
+        ) WHERE path_id = ?""", parameters + [filter_path_id[0], filter_path_id[0]])
+
+    next_urls = []
+    for timestamp, utc_offset, next_path, next_timestamp, next_id in rows:
+        if next_path is None or (report.session_timeout is not None and next_timestamp - timestamp > report.session_timeout):
+            report.exits += 1
+        elif next_path != report.filter_path:
+            next_urls.append((next_timestamp, next_id, next_path))
+            visit_timestamp = datetime.fromtimestamp(timestamp, timezone(timedelta(minutes=utc_offset)))
+            if report.min_timestamp is None or visit_timestamp < report.min_timestamp:
+                report.min_timestamp = visit_timestamp
+            if report.max_timestamp is None or visit_timestamp > report.max_timestamp:
+                report.max_timestamp = visit_timestamp
+
+    for next_timestamp, next_id, next_path in sorted(next_urls):  # Counted in log order, like a scan
+        report.next_url_counts[next_path] += 1
+
+# Report types that can run from the store, with the function that fills them
+store_queries = {
+    FolderSummaryReport: query_folder_summary,
+    SearchTermsReport: query_search_terms,
+    PageCtrReport: query_page_ctr,
+}
+
+# Function to fill reports from the store with SQL instead of scanning the logs, then export them
+# start and end limit the lines to a time range, e.g. start="2024-03-01", end="2024-04-01" for March (UTC)
+def run_store_reports(store_path, reports, start=None, end=None):
+    unsupported = [report.name for report in reports if type(report) not in store_queries]
+    if unsupported:
+        raise ValueError(f"These reports can't run from the log store: {', '.join(unsupported)}")
+
+    connection = open_log_store(store_path)
+    try:
+        for report in reports:
+            store_queries[type(report)](connection, report, start, end)
+            report.export()
+            print(f"{report.name} saved to {report.export_path}")
+    finally:
+        connection.close()
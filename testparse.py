@@ -1,45 +1,105 @@
-# Just prints the first three lines of the log file to test regex format - tests OK!
-import re
-from datetime import datetime
-
-# Regular expression to parse log lines
-log_pattern = re.compile(
-    r'(?P<ip>[\d\.:a-fA-F]+)\s+-\s+-\s+\[(?P<timestamp>.+?)\]\s+(?P<status>\d+)\s+"(?P<method>\w+)\s+(?P<path>.+?)\s+HTTP/\d\.\d"\s+(?P<size>\d+)\s+".+?"\s+"(?P<user_agent>.*?)"'
-)
-
-# Function to parse a single log line
-def parse_log_line(line):
-    match = log_pattern.match(line)
-    if match:
-        # Parse timestamp
-        timestamp_str = match.group('timestamp')
-        timestamp = datetime.strptime(timestamp_str, "%d/%b/%Y:%H:%M:%S %z")
-        
-        return {
-            'ip_address': match.group('ip'),
-            'timestamp': timestamp,
-            'status_code': int(match.group('status')),
-            'method': match.group('method'),
-            'request_path': match.group('path'),
-            'response_size': int(match.group('size')),
-            'user_agent': match.group('user_agent'),
-        }
-    return None
-
-# Function to print the first three log entries
-def print_first_three_logs(log_file_path):
-    count = 0
-    with open(log_file_path, 'r') as log_file:
-        for line in log_file:
-            log_data = parse_log_line(line)
-            if log_data:
-                print(log_data)
-                count += 1
-            if count >= 3:
-                break
-
-# Specify your log file path
-log_file_path = "nginx-logs/access.log"
-
-# Print the first three log entries
-print_first_three_logs(log_file_path)
\ No newline at end of file
+# Checks that a log format parses your server's logs before running the reports
+#
+# Reads a sample of the log file and prints:
+# 1. The first three parsed lines, to eyeball that each field holds the right thing
+# 2. How many lines matched, with examples of lines that didn't
+# 3. Parse speed in lines/sec, line by line and in blocks like logengine.py reads them
+#
+# Usage:
+#   python testparse.py                                   # Check the settings below
+#   python testparse.py access.log.2.gz                   # Check another log file
+#   python testparse.py access.log --format '%h %l %u %t "%r" %>s %b "%{Referer}i" "%{User-agent}i"'
+
+# Libraries
+import argparse
+import itertools
+import time
+
+import logengine
+from logformat import compile_log_format
+
+# Configuration
+log_file_path = "nginx-logs/access.log"  # Path to your log file (plain or .gz)
+log_format = logengine.log_format  # nginx log_format or Apache LogFormat string to check (None checks logengine.log_pattern)
+sample_lines = 100000  # Lines read from the start of the file
+unmatched_examples = 10  # Lines that didn't match to print
+
+# Function to read the first lines of a log file
+def read_sample(log_file_path, line_count):
+    with logengine.open_log_file(log_file_path) as log_file:
+        return list(itertools.islice(log_file, line_count))
+
+# Function to time a parse function over the sample, returning lines per second
+def lines_per_second(parse, items, line_count):
+    started = time.perf_counter()
+    for item in items:
+        parse(item)
+    return line_count / max(time.perf_counter() - started, 1e-9)
+
+# Function to check a log format against a sample of a log file and print the results
+def validate_log_format(log_file_path, log_format, sample_lines):
+    lines = read_sample(log_file_path, sample_lines)
+    if not lines:
+        print(f"No lines in {log_file_path}")
+        return
+
+    if log_format:
+        log_parser = compile_log_format(log_format, logengine.log_fields)
+        parse_line, parse_block = log_parser.parse_line, log_parser.parse_block
+        print(f"Log format: {log_parser.log_format}")
+        print(f"Parser: {'index-based, with the regex for lines it cannot cut' if log_parser.uses_index_parser else 'regex only'}")
+        if log_parser.missing_fields:
+            print(f"Not in this format (left empty): {', '.join(log_parser.missing_fields)}")
+    else:
+        log_parser = None
+        parse_line, parse_block = logengine.parse_log_line, logengine.parse_log_block
+        print("Log format: logengine.log_pattern")
+
+    # First three parsed lines
+    parsed = [parse_line(line) for line in lines]
+    print("\nFirst three parsed lines:")
+    for log_data in [log_data for log_data in parsed if log_data][:3]:
+        print(log_data)
+
+    # Match rate and lines that didn't match
+    unmatched = [line for line, log_data in zip(lines, parsed) if log_data is None]
+    matched_count = len(lines) - len(unmatched)
+    print(f"\nMatched {matched_count:,} of {len(lines):,} lines ({matched_count / len(lines):.1%})")
+    if unmatched:
+        print(f"Lines that didn't match ({min(len(unmatched), unmatched_examples)} of {len(unmatched):,}):")
+        for line in unmatched[:unmatched_examples]:
+            print("  " + line.rstrip('\r\n')[:300])
+
+    # Timestamps the reports will need to read
+    bad_timestamps = 0
+    for log_data in parsed:
+        if log_data and log_data['timestamp']:
+            try:
+                logengine.parse_timestamp(log_data['timestamp'])
+            except ValueError:
+                bad_timestamps += 1
+    if bad_timestamps:
+        print(f"Warning: timestamps not like 10/Oct/2024:13:55:36 -0700 on {bad_timestamps:,} lines, reports by date will fail there")
+
+    # Parse speed, line by line and in blocks of about logengine.log_block_size
+    blocks = []
+    block_lines = max(1, logengine.log_block_size * len(lines) // sum(len(line) for line in lines))
+    for start in range(0, len(lines), block_lines):
+        blocks.append(''.join(lines[start:start + block_lines]))
+    speeds = {'line by line': lines_per_second(parse_line, lines, len(lines)),
+              'in blocks': lines_per_second(parse_block, blocks, len(lines))}
+    if log_parser:
+        speeds['regex only'] = lines_per_second(log_parser.regex_parse_line, lines, len(lines))
+    speeds['log_pattern match only'] = lines_per_second(logengine.log_pattern.match, lines, len(lines))
+    print("\nParse speed:")
+    for label, speed in speeds.items():
+        print(f"  {label:24}{speed:>12,.0f} lines/sec")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that a log format parses a log file")
+    parser.add_argument('log_file', nargs='?', default=log_file_path, help="log file to read a sample from")
+    parser.add_argument('--format', default=log_format, help="nginx log_format or Apache LogFormat string")
+    parser.add_argument('--lines', type=int, default=sample_lines, help="lines to read from the start of the file")
+    args = parser.parse_args()
+
+    validate_log_format(args.log_file, args.format, args.lines)